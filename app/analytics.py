@@ -0,0 +1,199 @@
+import numpy as np
+import pandas as pd
+
+
+import cache
+import releases
+
+
+################################################################################
+#
+# CONSTANTS
+#
+################################################################################
+
+# Column each ranking orders its rows by, largest first
+RANKED_BY = {
+    'top':        'Reputation',
+    'top_answer': 'Counts',
+    'top_topics': 'ViewCount',
+}
+
+
+# Rows of each ranking selected without sorting the rest: unsorted, unfiltered
+# pages within them are served without ranking every row
+TOP_K = 100
+
+
+# Release file columns each pipeline reads; nothing else is loaded for them
+COLUMNS = {
+    'top':        {'Users': ['Id', 'Reputation', 'Views', 'UpVotes', 'DownVotes', 'DisplayName']},
+    'top_answer': {'Votes': ['PostId'], 'Comments': ['PostId']},
+    'top_topics': {'Posts': ['Tags', 'ViewCount', 'Score']},
+}
+
+
+# Posts.Tags holds every tag of a post between angle brackets, e.g. <python><ctypes>
+TAG = r'<([^<>]+)>'
+
+
+
+################################################################################
+#
+# Helper Functions
+#
+################################################################################
+
+
+# Results of each (pipeline, release), computed the first time a page needs them
+RESULTS = cache.Store('analytics')
+
+
+def frame(pipeline, release, name):
+    return releases.dataframe(release, name, COLUMNS[pipeline][name])
+
+
+
+def cached(pipeline, release, compute):
+    return RESULTS.cached((pipeline, release), lambda: compute(release), release)
+
+
+
+def widened(column):
+    # Values to aggregate, as int64 / float64: sums of compacted columns (downcast
+    # integers, float32) would overflow or round in their own dtype
+    if np.issubdtype(column.dtype, np.integer):
+        return column.values.astype(np.int64)
+    return column.values.astype(np.float64)
+
+
+
+def rank(df, by):
+    # Every row, largest `by` first; ties keep their row order
+    # As floats: negating the smallest value of a downcast integer column overflows
+    values = df[by].values.astype(np.float64)
+    return df.iloc[np.argsort(-values, kind='mergesort')].reset_index(drop=True)
+
+
+
+def top_k(df, by, k):
+    # The first k rows of rank(df, by), without sorting the rest
+    values = df[by].values.astype(np.float64)
+    if len(values) > k:
+        # Ties at the k-th value are kept in row order, as a stable sort would
+        kth    = -np.partition(-values, k - 1)[k - 1]
+        rows   = np.flatnonzero(values > kth)
+        ties   = np.flatnonzero(values == kth)[:k - len(rows)]
+        df     = df.iloc[np.sort(np.concatenate([rows, ties]))]
+        values = df[by].values.astype(np.float64)
+
+    return df.iloc[np.argsort(-values, kind='mergesort')].reset_index(drop=True)
+
+
+
+################################################################################
+#
+# INDEXES
+#
+################################################################################
+
+
+def post_counts(release, name):
+    return cached('post_counts_' + name, release, lambda r: frame('top_answer', r, name)['PostId'].value_counts())
+
+
+
+def vote_counts(release):
+    return post_counts(release, 'Votes')
+
+
+
+def comment_counts(release):
+    return post_counts(release, 'Comments')
+
+
+
+def _tag_index(release):
+    # One (Tag, Row) entry per tag of each post, Row being the post's position
+    # in the Posts frame
+    posts = frame('top_topics', release, 'Posts')
+    tags  = posts['Tags'].dropna().astype(str).str.extractall(TAG)[0]
+
+    return pd.DataFrame({
+        'Tag': tags.values,
+        'Row': posts.index.get_indexer(tags.index.get_level_values(0)),
+    }, columns=['Tag', 'Row'])
+
+
+
+def tag_index(release):
+    return cached('tag_index', release, _tag_index)
+
+
+
+################################################################################
+#
+# ANALYTICS PIPELINES
+#
+################################################################################
+
+
+# Each pipeline computes one row per post / user / tag; rankings order those
+# rows, whole, so the paged tables sort and filter every row
+
+
+def _answer_counts(release):
+    # Joining Votes and Comments on PostId yields votes x comments rows per post
+    counts = (vote_counts(release) * comment_counts(release)).dropna().astype(int)
+    return pd.DataFrame({'PostId': counts.index.values, 'Counts': counts.values}, columns=['PostId', 'Counts'])
+
+
+
+def _topic_counts(release):
+    posts = frame('top_topics', release, 'Posts')
+    index = tag_index(release)
+
+    # Rows cut short in a damaged release leave text in ViewCount / Score; sum numbers only
+    df = pd.DataFrame({
+        'Tag':       index['Tag'].values,
+        'Posts':     1,
+        'ViewCount': widened(pd.to_numeric(posts['ViewCount'], errors='coerce'))[index['Row'].values],
+        'Score':     widened(pd.to_numeric(posts['Score'], errors='coerce'))[index['Row'].values],
+    }, columns=['Tag', 'Posts', 'ViewCount', 'Score'])
+    # Tags in alphabetical order: equal view counts rank alphabetically
+    return df.groupby('Tag').sum().reset_index()
+
+
+
+def counts(pipeline, release):
+    if pipeline == 'top':
+        return frame('top', release, 'Users')
+    if pipeline == 'top_answer':
+        return cached('answer_counts', release, _answer_counts)
+    return cached('topic_counts', release, _topic_counts)
+
+
+
+def ranking(pipeline, release):
+    return cached(pipeline, release, lambda r: rank(counts(pipeline, r), RANKED_BY[pipeline]))
+
+
+
+def top(pipeline, release, k=TOP_K):
+    # First k rows of the ranking, e.g. the pages a table opens on
+    return RESULTS.cached((pipeline, release, k), lambda: top_k(counts(pipeline, release), RANKED_BY[pipeline], k), release)
+
+
+
+def top_answers(release):
+    return ranking('top_answer', release)
+
+
+
+def top_users(release):
+    return ranking('top', release)
+
+
+
+def top_topics(release):
+    return ranking('top_topics', release)
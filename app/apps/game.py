@@ -94,10 +94,12 @@ VOTES_ATTRIBUTES = [
     {'label': 'BountyAmount',    'value': 'BountyAmount'},
 ]
 
+# The questionnaire is about these three releases (see ANSWERS), whatever else
+# is added to the data directory
 Q_RELEASES_OPTIONS = [
-    {'label': 'January 1rst 2018',  'value': 'R1'},
-    {'label': 'January 2nd 2018',   'value': 'R2'},
-    {'label': 'January 3rd 2018',   'value': 'R3'}
+    {'label': 'January 1st 2018',   'value': 'jan-01-02_2018'},
+    {'label': 'January 2nd 2018',   'value': 'jan-02-03_2018'},
+    {'label': 'January 3rd 2018',   'value': 'jan-03-04_2018'},
 ]
 
 Q_SLIDER_MARKS = {
@@ -119,10 +121,10 @@ QUESTIONS = [
 ]
 
 ANSWERS  = [
-    'R3',
-    'R1',
+    'jan-03-04_2018',
+    'jan-01-02_2018',
     ['Score', 'FavoriteCount', 'ViewCount'],
-    'R2',    
+    'jan-02-03_2018',    
     [
         ['Id', 'Name'], 
         ['PostId', 'Score'], 
@@ -578,7 +580,7 @@ def onClick(button, button_end, timestamp, q_effort, q_release, q_badges, q_comm
             'Q': INIT_Q(I),
             'Q_EFFORTS': [random.randint(1,2)       for x in range(6)] + [random.randint(0,1)  for x in range(6)],
             'Q_TIMES':   [random.randint(0,300)     for x in range(6)] + [random.randint(0,180) for x in range(6)],
-            'Q_VALUES':  ['R1', 'R1', ['Id'], 'R1', [[],[],[],[],[]], [[],[],[],[],[]]] + ANSWERS,
+            'Q_VALUES':  ['jan-01-02_2018', 'jan-01-02_2018', ['Id'], 'jan-01-02_2018', [[],[],[],[],[]], [[],[],[],[],[]]] + ANSWERS,
             'Q_SCORES':  [random.randint(0,1)       for x in range(6)] + [1]*6,
             'PREV_TS': 0
         }
@@ -591,7 +593,7 @@ def onClick(button, button_end, timestamp, q_effort, q_release, q_badges, q_comm
             
             # Set default value if value omitted
             q_effort   = q_effort    if q_effort    else 1
-            q_release  = q_release   if q_release   else 'R3'
+            q_release  = q_release   if q_release   else 'jan-03-04_2018'
             q_posts    = q_posts     if q_posts     else []
             q_badges   = q_badges    if q_badges    else []
             q_users    = q_users     if q_users     else []
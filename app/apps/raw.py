@@ -20,6 +20,14 @@ import csv
 import math
 
 
+import analytics
+import cache
+import profiles
+import registry
+import releases
+import tables
+
+
 
 ################################################################################
 # 
@@ -27,48 +35,7 @@ import math
 # 
 ################################################################################
 
-RELEASES_FILES = [
-    'Votes',
-    'Badges',
-    'Comments',
-    'Posts',
-    'Users'
-]
-
-
-RELEASES_FILES_DATAFRAMES = {
-
-    'R1' : {
-        'Votes' :   pd.read_csv('./data/releases/jan-01-02_2018/VOTES_jan-01-02_2018.csv'),
-        'Badges':   pd.read_csv('./data/releases/jan-01-02_2018/BADGES_jan-01-02_2018.csv'),
-        'Comments': pd.read_csv('./data/releases/jan-01-02_2018/COMMENTS_jan-01-02_2018.csv'),
-        'Posts':    pd.read_csv('./data/releases/jan-01-02_2018/POSTS_jan-01-02_2018.csv'),
-        'Users':    pd.read_csv('./data/releases/jan-01-02_2018/USERS_jan-01-02_2018.csv'),
-    },
-    
-    'R2' : {
-        'Votes' :   pd.read_csv('./data/releases/jan-02-03_2018/VOTES_jan-02-03_2018.csv'),
-        'Badges':   pd.read_csv('./data/releases/jan-02-03_2018/BADGES_jan-02-03_2018.csv'),
-        'Comments': pd.read_csv('./data/releases/jan-02-03_2018/COMMENTS_jan-02-03_2018.csv'),
-        'Posts':    pd.read_csv('./data/releases/jan-02-03_2018/POSTS_jan-02-03_2018.csv'),
-        'Users':    pd.read_csv('./data/releases/jan-02-03_2018/USERS_jan-02-03_2018.csv'),
-    },
-    
-    'R3' : {
-        'Votes' :   pd.read_csv('./data/releases/jan-03-04_2018/VOTES_jan-03-04_2018.csv'),
-        'Badges':   pd.read_csv('./data/releases/jan-03-04_2018/BADGES_jan-03-04_2018.csv'),
-        'Comments': pd.read_csv('./data/releases/jan-03-04_2018/COMMENTS_jan-03-04_2018.csv'),
-        'Posts':    pd.read_csv('./data/releases/jan-03-04_2018/POSTS_jan-03-04_2018.csv', quoting=csv.QUOTE_NONE, error_bad_lines=False),
-        'Users':    pd.read_csv('./data/releases/jan-03-04_2018/USERS_jan-03-04_2018.csv'),
-    },
-}
-
-
-RELEASES_OPTIONS = [
-    {'label': 'January 1rst 2018',  'value': 'R1'},
-    {'label': 'January 2nd 2018',   'value': 'R2'},
-    {'label': 'January 3rd 2018',   'value': 'R3'}
-]
+RELEASES_FILES = releases.RELEASES_FILES
 
 
 OPERATIONS_OPTIONS = [
@@ -81,6 +48,18 @@ OPERATIONS_OPTIONS = [
 ]
 
 
+# Rankings shown in the paged 'raw-table', by operation
+RANKINGS = {
+    'top':        analytics.top_users,
+    'top_answer': analytics.top_answers,
+    'top_topics': analytics.top_topics,
+}
+
+
+# Shown by a page left open on a release the watcher has removed since
+GONE = 'Release no longer available, reload the page'
+
+
 ################################################################################
 # 
 # Helper Functions
@@ -94,19 +73,21 @@ def MDfy(v):
 
 
 
-def desc(df, total):
-    cols  = [ '{}. {}'.format(str(i+1), str(df.columns.values[i])) for i in range(len(df.columns.values))]    
+def desc(release, name, total):
+    cols     = [ '{}. {}'.format(str(i+1), str(c)) for i, c in enumerate(releases.header(release, name))]    
+    rejected = releases.rejected(release, name)
     return dcc.Markdown(MDfy('''
         
         Release: {} recs
         
         File: **{}** recs x **{}** cols  
-        
+        {}
         {}  
     ''').format( 
     	total,
-    	df.shape[0], 
-    	df.shape[1],
+    	releases.rows(release, name), 
+    	len(cols),
+    	'Malformed: **{}** recs skipped\n'.format(rejected) if rejected else '',
     	'\n\n'.join(cols) 
     ))
     
@@ -121,11 +102,22 @@ def desc(df, total):
 ################################################################################
 
 
-def table(df):  
+# DISTR figures of each (release, file, column), built when a tab is first opened
+# and kept as plain dicts: go.Figure objects are validated again when unpickled
+FIGURES = cache.Store('raw_figures')
+
+
+def table(df, id=None):  
+    # Tables with an id are paged, sorted and filtered by the server (see onTablePage):
+    # `df` then holds the first page only, the rows on screen when the table opens
+    mode = 'fe' if id is None else 'be'
+    ids  = {} if id is None else {'id': id}
+    
     return dash_table.DataTable(
         columns=[{"name": i, "id": i} for i in df.columns],
         data=df.to_dict("rows"),
         style_cell={'textAlign': 'left'},
+        style_filter={'textAlign': 'left'},
         style_as_list_view=True,
         style_cell_conditional=[{
             'if': {'row_index': 'odd'},
@@ -135,37 +127,32 @@ def table(df):
             'backgroundColor': 'white',
             'fontWeight': 'bold'
         },    
-        sorting=True,
-        pagination_mode="fe",
-        pagination_settings={
-            "displayed_pages": 1,
-            "current_page": 0,
-            "page_size": 10,
-        },        
+        sorting=True if id is None else mode,
+        filtering=False if id is None else mode,
+        pagination_mode=mode,
+        pagination_settings=tables.PAGINATION_SETTINGS,        
+        **ids
     )
     
 
-def nulls_table(df):
-	data = []
-	for col in df.columns:
-		nulls = df[df[col].isnull()].shape[0]
-		ratio = round( nulls/df[col].shape[0], 2) 
-		data.append( (col, nulls, ratio) )
-	
-	return table( pd.DataFrame(data, columns=['Attribute', 'Nulls', 'Ratio (%)']) )
+def nulls_table(release, name):
+    return table( profiles.nulls(release, name) )
 
 	
 
 
-def histogram(df, att):
+def _histogram(release, name, att):
+    bins = profiles.histogram(release, name, att)
     return go.Figure(
-        data=[go.Histogram(
-            x=list(df[att]),
-            nbinsx=20,
+        data=[go.Bar(
+            x=bins['x'],
+            y=bins['y'],
+            width=bins['width'],
             name=att
         )],
         layout=go.Layout(
-            title=att,
+            title=bins['title'],
+            xaxis={'type': 'category'} if bins['kind'] == 'categorical' else {},
             showlegend=False,
             autosize=True,
             margin=go.layout.Margin(
@@ -181,14 +168,19 @@ def histogram(df, att):
 
 
 
-def tab(df):
-    cols  = list(df.columns.values)
+def histogram(release, name, att):
+    return FIGURES.cached((release, name, att), lambda: _histogram(release, name, att).to_plotly_json(), release)
+
+
+
+def tab(release, name):
+    cols  = profiles.columns(release, name)
     rows  = []
     for i in range(0, len(cols), 2):  
         rows.append(
             html.Div([
-                dcc.Graph(className='six columns', figure=histogram(df, cols[i])),
-                dcc.Graph(className='six columns', figure=histogram(df, cols[i+1]) if i+1 < len(cols) else None)
+                dcc.Graph(className='six columns', figure=histogram(release, name, cols[i])),
+                dcc.Graph(className='six columns', figure=histogram(release, name, cols[i+1]) if i+1 < len(cols) else None)
             ], className='row'),
         )
         
@@ -197,49 +189,6 @@ def tab(df):
 
 
 
-#'''
-RELEASES_FILES_TABS = {
-
-    'R1' : {
-        'Votes' :   tab(RELEASES_FILES_DATAFRAMES['R1']['Votes']),
-        'Badges':   tab(RELEASES_FILES_DATAFRAMES['R1']['Badges']),
-        'Comments': tab(RELEASES_FILES_DATAFRAMES['R1']['Comments']),
-        'Posts':    tab(RELEASES_FILES_DATAFRAMES['R1']['Posts']),
-        'Users':    tab(RELEASES_FILES_DATAFRAMES['R1']['Users']),
-    },
-
-    'R2' : {
-        'Votes' :   tab(RELEASES_FILES_DATAFRAMES['R2']['Votes']),
-        'Badges':   tab(RELEASES_FILES_DATAFRAMES['R2']['Badges']),
-        'Comments': tab(RELEASES_FILES_DATAFRAMES['R2']['Comments']),
-        'Posts':    tab(RELEASES_FILES_DATAFRAMES['R2']['Posts']),
-        'Users':    tab(RELEASES_FILES_DATAFRAMES['R2']['Users']),
-    },
-
-    'R3' : {
-        'Votes' :   tab(RELEASES_FILES_DATAFRAMES['R3']['Votes']),
-        'Badges':   tab(RELEASES_FILES_DATAFRAMES['R3']['Badges']),
-        'Comments': tab(RELEASES_FILES_DATAFRAMES['R3']['Comments']),
-        'Posts':    tab(RELEASES_FILES_DATAFRAMES['R3']['Posts']),
-        'Users':    tab(RELEASES_FILES_DATAFRAMES['R3']['Users']),
-    },
-
-}
-
-'''
-RELEASES_FILES_TABS = {
-
-    'R1' : {
-        'Votes' :   tab(RELEASES_FILES_DATAFRAMES['R1']['Votes']),
-        'Badges':   tab(RELEASES_FILES_DATAFRAMES['R1']['Badges']),
-        'Comments': tab(RELEASES_FILES_DATAFRAMES['R1']['Comments']),
-        'Posts':    tab(RELEASES_FILES_DATAFRAMES['R1']['Posts']),
-        'Users':    tab(RELEASES_FILES_DATAFRAMES['R1']['Users']),
-    },
-}
-'''
-
-
 MD_TEXT = {
     
     'histo': MDfy(
@@ -254,17 +203,13 @@ MD_TEXT = {
     
     'nulls': MDfy(
     ''' # Read csv file
-        df   = pd.read_csv('POSTS_jan-01-02_2018.csv')
-        data = []
+        df    = pd.read_csv('POSTS_jan-01-02_2018.csv')
         
-        # Compute NULLs and NULLs ratio for each dataframe' column  
-        for col in df.columns:
-        	sel   = df[col].isnull()         # Identify NULLs
-        	nulls = df[sel].shape[0]         # Count NULLs
-        	ratio = nulls/df[col].shape[0]   # NULLs / column size
-        	data.append( (col, nulls, ratio) )
+        # Compute NULLs and NULLs ratio of every dataframe' column in one pass
+        nulls = df.isnull().sum()        # Count NULLs
+        ratio = df.isnull().mean()       # NULLs / column size
 
-        Table( pd.DataFrame(data) )'''	
+        Table( pd.DataFrame({'Nulls': nulls, 'Ratio': ratio}) )'''	
     ),
     
     
@@ -272,13 +217,15 @@ MD_TEXT = {
     '''# Read csv file
        df = pd.read_csv('POSTS_jan-01-02_2018.csv')
        
-       # Select relevant columns
-       df = df[ ['Tags', 'ViewCount'] ]
+       # One row per (post, tag): '<python><ctypes>' gives 'python' and 'ctypes'
+       tags = df['Tags'].str.extractall('<([^<>]+)>')[0]
+       df   = df[['ViewCount', 'Score']].iloc[tags.index.get_level_values(0)]
+       df['Tag'] = tags.values
        
        # Group and aggregate
-       df = df.groupby('Tags').sum()
+       df = df.groupby('Tag').sum()
        
-       Table(df)'''	
+       Table( df.sort_values('ViewCount', ascending=False) )'''	
     ),
     
     
@@ -287,13 +234,14 @@ MD_TEXT = {
        df1 = pd.read_csv('VOTES_jan-01-02_2018.csv')
        df2 = pd.read_csv('COMMENTS_jan-01-02_2018.csv')
        
-       # Join VOTES and COMMENTS belonging to the same POST ('PostId')
-       df3 = pd.merge(df1, df2, on='PostId')
+       # Count VOTES and COMMENTS of each POST ('PostId')
+       votes    = df1['PostId'].value_counts()
+       comments = df2['PostId'].value_counts()
        
-       # Group and count 
-       df = df.groupby('PostId').size()
+       # Joining VOTES and COMMENTS on 'PostId' gives votes x comments rows per POST
+       df = (votes * comments).dropna()
        
-       Table(df)'''	
+       Table( df.sort_values(ascending=False) )'''	
     ),    
  
  
@@ -304,10 +252,8 @@ MD_TEXT = {
        # Select relevant fields
        df = df[['Id','Reputation','Views','UpVotes','DownVotes','DisplayName']]
        
-       # Sort 
-       df = df.sort_values(by='Reputation')
-       
-       Table(df)'''	
+       # Best reputations first
+       Table( df.sort_values('Reputation', ascending=False) )'''	
     ),    
      
  
@@ -337,29 +283,33 @@ MD_TEXT = {
 
 from app import app
 
-layout = html.Div([
+
+# Built on each visit: releases added while the server runs are listed
+def layout():
+    options = registry.options()
+    return html.Div([
     
-    dcc.Markdown('# Exploring Stackoverflow Releases'),
-    html.Div([ 
-        dcc.Markdown(''),
-    ], style={'margin-bottom': '30'}),
+        dcc.Markdown('# Exploring Stackoverflow Releases'),
+        html.Div([ 
+            dcc.Markdown(''),
+        ], style={'margin-bottom': '30'}),
     
-    html.Div([
-
-        html.Div(className='three columns', children=[
-            dcc.Markdown('**Release**'),
-            dcc.RadioItems(id='release', options=RELEASES_OPTIONS, value='R1', style={'margin-bottom': '20'}),
-            dcc.Markdown('**Analytics Pipelines**'),
-            dcc.RadioItems(id='operation', options=OPERATIONS_OPTIONS, value='shape'), 
-        ]),
+        html.Div([
+
+            html.Div(className='three columns', children=[
+                dcc.Markdown('**Release**'),
+                dcc.RadioItems(id='release', options=options, value=options[0]['value'] if options else None, style={'margin-bottom': '20'}),
+                dcc.Markdown('**Analytics Pipelines**'),
+                dcc.RadioItems(id='operation', options=OPERATIONS_OPTIONS, value='shape'), 
+            ]),
         
-        html.Div(className='nine columns', children=[
-            html.Div(id='output-raw',      children='[]', ),
-        ]),
+            html.Div(className='nine columns', children=[
+                html.Div(id='output-raw',      children='[]', ),
+            ]),
     
-    ], className='row')
+        ], className='row')
     
-], className='container')
+    ], className='container')
 
 
 
@@ -372,69 +322,61 @@ layout = html.Div([
 ################################################################################
 
 
-@app.callback(
+@cache.callback(app, 'raw',
     Output(component_id='output-raw', component_property='children'),
     [Input(component_id='operation',  component_property='value'),
      Input(component_id='release',    component_property='value')],
 )
 def onOperationSelected(operation, release):
+
+    if release not in registry.RELEASES:
+        return dcc.Markdown(GONE)
     
     if operation == 'shape':
         
         total = 0
-        for k, df in RELEASES_FILES_DATAFRAMES[release].items():
-            total += df.shape[0]
+        for name in RELEASES_FILES:
+            total += releases.rows(release, name)
         
         return html.Div([
             dcc.Markdown('**Code Behind**'),
             dcc.Textarea(value=MD_TEXT['desc'], style={'width': '100%', 'height':50}),
             dcc.Tabs(id="tabs", children=[
-                dcc.Tab(label='Votes',    children=desc(RELEASES_FILES_DATAFRAMES[release]['Votes'], total)),
-                dcc.Tab(label='Badges',   children=desc(RELEASES_FILES_DATAFRAMES[release]['Badges'], total)),
-                dcc.Tab(label='Comments', children=desc(RELEASES_FILES_DATAFRAMES[release]['Comments'], total)),
-                dcc.Tab(label='Posts',    children=desc(RELEASES_FILES_DATAFRAMES[release]['Posts'], total)),
-                dcc.Tab(label='Users',    children=desc(RELEASES_FILES_DATAFRAMES[release]['Users'], total)),
+                dcc.Tab(label='Votes',    children=desc(release, 'Votes', total)),
+                dcc.Tab(label='Badges',   children=desc(release, 'Badges', total)),
+                dcc.Tab(label='Comments', children=desc(release, 'Comments', total)),
+                dcc.Tab(label='Posts',    children=desc(release, 'Posts', total)),
+                dcc.Tab(label='Users',    children=desc(release, 'Users', total)),
             ])
         ])
         
     
     if operation == 'top':
-        df = RELEASES_FILES_DATAFRAMES[release]['Users']
-        df = df[['Id','Reputation','Views','UpVotes','DownVotes','DisplayName']]
-        df = df.sort_values(by='Reputation', ascending=False)
+        df = analytics.top(operation, release).head(tables.PAGE_SIZE)
         
         return html.Div(children=[
 			dcc.Markdown('**Code Behind**'),
             dcc.Textarea(value=MD_TEXT['top_user'], style={'width': '100%', 'height':50}),               
-            table(df)
+            table(df, 'raw-table')
         ])
         
     
     if operation == 'top_answer':
-        df1 = RELEASES_FILES_DATAFRAMES[release]['Votes']
-        df2 = RELEASES_FILES_DATAFRAMES[release]['Comments']
-        df3 = pd.merge(df1, df2, on=['PostId'])
-        
-        df3 = df3.groupby(['PostId'])
-        df3 = df3.size().reset_index(name='Counts')
-        df3 = df3.sort_values(by='Counts', ascending=False)
+        df3 = analytics.top(operation, release).head(tables.PAGE_SIZE)
 
         return html.Div(children=[
 			dcc.Markdown('**Code Behind**'),
             dcc.Textarea(value=MD_TEXT['top_answer'], style={'width': '100%', 'height':50}),         
-            table(df3)        
+            table(df3, 'raw-table')
         ])
         
      
     if operation == 'top_topics':
-        df = RELEASES_FILES_DATAFRAMES[release]['Posts']
-        df = df[['Tags', 'ViewCount']].groupby('Tags').sum()
-        df['Tags'] = df.index.values
-        df = df.sort_values(by='ViewCount', ascending=False)
+        df = analytics.top(operation, release).head(tables.PAGE_SIZE)
         return html.Div(children=[
             dcc.Markdown('**Code Behind**'),
             dcc.Textarea(value=MD_TEXT['top_topics'], style={'width': '100%', 'height':50}),
-            table(df) 
+            table(df, 'raw-table')
         ])
     
     
@@ -444,11 +386,11 @@ def onOperationSelected(operation, release):
             dcc.Markdown('**Code Behind**'),
             dcc.Textarea(value=MD_TEXT['nulls'], style={'width': '100%', 'height':50}),
             dcc.Tabs(id="tabs", children=[
-                dcc.Tab(label='Votes',    children=nulls_table(RELEASES_FILES_DATAFRAMES[release]['Votes'])),
-                dcc.Tab(label='Badges',   children=nulls_table(RELEASES_FILES_DATAFRAMES[release]['Badges'])),
-                dcc.Tab(label='Comments', children=nulls_table(RELEASES_FILES_DATAFRAMES[release]['Comments'])),
-                dcc.Tab(label='Posts',    children=nulls_table(RELEASES_FILES_DATAFRAMES[release]['Posts'])),
-                dcc.Tab(label='Users',    children=nulls_table(RELEASES_FILES_DATAFRAMES[release]['Users'])),
+                dcc.Tab(label='Votes',    children=nulls_table(release, 'Votes')),
+                dcc.Tab(label='Badges',   children=nulls_table(release, 'Badges')),
+                dcc.Tab(label='Comments', children=nulls_table(release, 'Comments')),
+                dcc.Tab(label='Posts',    children=nulls_table(release, 'Posts')),
+                dcc.Tab(label='Users',    children=nulls_table(release, 'Users')),
             ])
         ])
             
@@ -459,13 +401,10 @@ def onOperationSelected(operation, release):
         return html.Div([
             dcc.Markdown('**Code Behind**'),
             dcc.Textarea(value=MD_TEXT['histo'], style={'width': '100%', 'height':50}),
-            dcc.Tabs(id="tabs", children=[
-                dcc.Tab(label='Votes',    children=RELEASES_FILES_TABS[release]['Votes']),
-                dcc.Tab(label='Badges',   children=RELEASES_FILES_TABS[release]['Badges']),
-                dcc.Tab(label='Comments', children=RELEASES_FILES_TABS[release]['Comments']),
-                dcc.Tab(label='Posts',    children=RELEASES_FILES_TABS[release]['Posts']),
-                dcc.Tab(label='Users',    children=RELEASES_FILES_TABS[release]['Users']),
-            ])
+            dcc.Tabs(id="raw-histo-tabs", value=RELEASES_FILES[0], children=[
+                dcc.Tab(label=name, value=name) for name in RELEASES_FILES
+            ]),
+            html.Div(id='raw-histo-tab'),
         ])
 
  
@@ -474,3 +413,38 @@ def onOperationSelected(operation, release):
 
 
 
+@app.callback(
+    Output(component_id='raw-histo-tab',  component_property='children'),
+    [Input(component_id='raw-histo-tabs', component_property='value')],
+    [State(component_id='release',        component_property='value')],
+)
+def onHistoTabSelected(name, release):
+    if release not in registry.RELEASES:
+        return dcc.Markdown(GONE)
+    return tab(release, name)
+
+
+
+@app.callback(
+    Output(component_id='raw-table',  component_property='data'),
+    [Input(component_id='raw-table',  component_property='pagination_settings'),
+     Input(component_id='raw-table',  component_property='sorting_settings'),
+     Input(component_id='raw-table',  component_property='filtering_settings')],
+    [State(component_id='operation',  component_property='value'),
+     State(component_id='release',    component_property='value')],
+)
+def onTablePage(pagination, sorting, filtering, operation, release):
+    if release not in registry.RELEASES:
+        return []
+
+    settings = pagination or tables.PAGINATION_SETTINGS
+    size     = settings.get('page_size', tables.PAGE_SIZE)
+    start    = settings.get('current_page', 0) * size
+
+    # The pages a table opens on come from the top-k selection; sorting, filtering
+    # or paging past it ranks every row (once per release)
+    if not sorting and not filtering and start + size <= analytics.TOP_K:
+        return analytics.top(operation, release).iloc[start:start + size].to_dict('rows')
+
+    df = RANKINGS[operation](release)
+    return tables.page((operation, release), df, pagination, sorting, filtering)
@@ -1,4 +1,5 @@
 
+import numpy as np
 import pandas as pd
 import dash
 import dash_table
@@ -11,6 +12,7 @@ import plotly.plotly as py
 import plotly.graph_objs as go
 import plotly.dashboard_objs as dashboard
 
+import collections
 import datetime
 import json
 import random
@@ -18,7 +20,12 @@ import re
 import csv
 
 
+import cache
 import curare_releaseView as cr_View
+import profiles
+import registry
+import releases
+import tables
 
 
 ################################################################################
@@ -37,13 +44,6 @@ RELEASES_FILES = [
 ]
 
 
-RELEASES_OPTIONS = [
-    {'label': 'January 1rst 2018',  'value': 'R1'},
-    {'label': 'January 2nd 2018',   'value': 'R2'},
-    {'label': 'January 3rd 2018',   'value': 'R3'}
-]
-
-
 OPERATIONS_OPTIONS = [
     {'label': 'VIEW["SCHEMA"]',  'value': 'schema'},
     {'label': 'VIEW["COUNT"]',   'value': 'count' },
@@ -55,53 +55,30 @@ OPERATIONS_OPTIONS = [
 
 
 
-VIEWS = {
-    'R1': json.load(open('./data/views/R1.json')), 
-    'R2': json.load(open('./data/views/R2.json')),
-    'R3': json.load(open('./data/views/R3.json')),
-}
+# Stats table columns, by descriptor field
+STATS_FIELDS = collections.OrderedDict([
+    ('min',    'minValue'),
+    ('max',    'maxValue'),
+    ('median', 'median'),
+    ('mean',   'mean'),
+    ('nulls',  'nullValue'),
+])
 
 
-VIEWS_NULLS = {
-    'R1': [sum(i['nullValue']) for i in VIEWS['R1']['attributeDescList']],
-    'R2': [sum(i['nullValue']) for i in VIEWS['R2']['attributeDescList']],
-    'R3': [sum(i['nullValue']) for i in VIEWS['R3']['attributeDescList']],
-}
+STATS_COLUMNS  = ['Attribute'] + list(STATS_FIELDS)
+SCHEMA_COLUMNS = ['Attribute', 'Type']
 
 
-VIEWS_SCHEMAS = {
-    'R1': cr_View.getReleaseViewSchemata(VIEWS['R1'], RELEASES_FILES),
-    'R2': cr_View.getReleaseViewSchemata(VIEWS['R2'], RELEASES_FILES),
-    'R3': cr_View.getReleaseViewSchemata(VIEWS['R3'], RELEASES_FILES),
-}
+# Shown by a page left open on a release the watcher has removed since
+GONE = 'Release no longer available, reload the page'
 
 
-RELEASES_FILES_DATAFRAMES = {
 
-    'R1' : {
-        'Votes' :   pd.read_csv('./data/releases/jan-01-02_2018/VOTES_jan-01-02_2018.csv'),
-        'Badges':   pd.read_csv('./data/releases/jan-01-02_2018/BADGES_jan-01-02_2018.csv'),
-        'Comments': pd.read_csv('./data/releases/jan-01-02_2018/COMMENTS_jan-01-02_2018.csv'),
-        'Posts':    pd.read_csv('./data/releases/jan-01-02_2018/POSTS_jan-01-02_2018.csv'),
-        'Users':    pd.read_csv('./data/releases/jan-01-02_2018/USERS_jan-01-02_2018.csv'),
-    },
-    
-    'R2' : {
-        'Votes' :   pd.read_csv('./data/releases/jan-02-03_2018/VOTES_jan-02-03_2018.csv'),
-        'Badges':   pd.read_csv('./data/releases/jan-02-03_2018/BADGES_jan-02-03_2018.csv'),
-        'Comments': pd.read_csv('./data/releases/jan-02-03_2018/COMMENTS_jan-02-03_2018.csv'),
-        'Posts':    pd.read_csv('./data/releases/jan-02-03_2018/POSTS_jan-02-03_2018.csv'),
-        'Users':    pd.read_csv('./data/releases/jan-02-03_2018/USERS_jan-02-03_2018.csv'),
-    },
-    
-    'R3' : {
-        'Votes' :   pd.read_csv('./data/releases/jan-03-04_2018/VOTES_jan-03-04_2018.csv'),
-        'Badges':   pd.read_csv('./data/releases/jan-03-04_2018/BADGES_jan-03-04_2018.csv'),
-        'Comments': pd.read_csv('./data/releases/jan-03-04_2018/COMMENTS_jan-03-04_2018.csv'),
-        'Posts':    pd.read_csv('./data/releases/jan-03-04_2018/POSTS_jan-03-04_2018.csv', quoting=csv.QUOTE_NONE, error_bad_lines=False),
-        'Users':    pd.read_csv('./data/releases/jan-03-04_2018/USERS_jan-03-04_2018.csv'),
-    },
-}
+# Release views and what is derived from them, built the first time a callback
+# asks for them (or loaded from the artifacts bundle, see bundle.py)
+VIEWS        = cache.Store('release_views')
+STATS_FRAMES = cache.Store('stats_frames')
+VIEWS_TABLES = cache.Store('views_tables')
 
 
 
@@ -114,47 +91,61 @@ RELEASES_FILES_DATAFRAMES = {
 ################################################################################
 
 
-def viewFile(name): 
-    for rf in RELEASES_FILES:
-        if rf.lower() in name.lower():
-            return rf
+def view(release):
+    return VIEWS.cached((release,), lambda: cr_View.ReleaseView.load(registry.metadata(release)['view']), release)
 
 
 
-def release_stats(release):
+def described(release):
+    # The registry matched the view by its first descriptor (see registry.view_folder);
+    # the others are checked once it is loaded
+    return release in registry.views() and view(release).folders == [release]
+
+
+
+def _stats(release):
+    # One row per (File, Attribute) of the view, every collection's arrays laid
+    # end to end; values stay objects as their types differ from file to file
+    v       = view(release)
+    columns = collections.OrderedDict([
+        ('File',      np.repeat(v.names, [len(atts) for atts in v.attributes])),
+        ('Attribute', np.concatenate([np.asarray(atts, dtype=object) for atts in v.attributes])),
+        ('Type',      np.concatenate([np.asarray(types, dtype=object) for types in v.types])),
+    ])
+    for column, field in STATS_FIELDS.items():
+        columns[column] = np.concatenate([np.asarray(values, dtype=object) for values in v.fields[field]])
+
+    return pd.DataFrame(columns)
+
+
+
+def stats(release):
+    return STATS_FRAMES.cached((release,), lambda: _stats(release), release)
 
-    obj = {
-        'name'   : [viewFile(desc['name']) for desc in VIEWS[release]['attributeDescList']],
-        'min'    : [desc['minValue'] for desc in VIEWS[release]['attributeDescList']],
-        'max'    : [desc['maxValue'] for desc in VIEWS[release]['attributeDescList']],
-        'median' : [desc['median']   for desc in VIEWS[release]['attributeDescList']],
-        'mean'   : [desc['mean']     for desc in VIEWS[release]['attributeDescList']],            
-        'nulls'  : [desc['nullValue']for desc in VIEWS[release]['attributeDescList']],
-    }
-    
-    stats = {}
-    for i in range(len(obj['name'])):
-    
-        file_atts=[]
-        for att_schema in VIEWS_SCHEMAS[release][i][1]: 
-            for v in att_schema.values():
-                file_atts.append(v)       
-                        
-        obj2 = {
-            'Attribute' : [att[0] for att in file_atts],
-            'min'    : obj['min'][i],
-            'max'    : obj['max'][i],
-            'median' : obj['median'][i],
-            'mean'   : obj['mean'][i],
-            'nulls'  : obj['nulls'][i]
-        }
-        
-        df       = pd.DataFrame(obj2)
-        df.index = df['Attribute'] 
-        
-        stats[obj['name'][i]] = df.drop(['Attribute'], axis=1)
-    
-    return stats
+
+
+def files(release):
+    # Files of the view, in its order
+    return view(release).names
+
+
+
+def view_table(release, name, columns):
+    # Rows of one file, each column back to the type of that file's values
+    def rows():
+        return stats(release)[columns].iloc[view(release).rows(name)].reset_index(drop=True).infer_objects()
+
+    return VIEWS_TABLES.cached((release, name) + tuple(columns), rows, release)
+
+
+
+def stats_table(release, name):
+    return view_table(release, name, STATS_COLUMNS)
+
+
+
+def schema_table(release, name):
+    return view_table(release, name, SCHEMA_COLUMNS)
 
 
 
@@ -165,6 +156,11 @@ def release_stats(release):
 ################################################################################
 
 
+# DISTR figures of each (release, file, column), built when a tab is first opened
+# and kept as plain dicts: go.Figure objects are validated again when unpickled
+FIGURES = cache.Store('views_figures')
+
+
 def bar(values, labels):
     
     return go.Figure(
@@ -183,10 +179,17 @@ def bar(values, labels):
 
 
 
-def table(df):  
+def table(df, id=None, key=None):  
+    # Tables with an id are paged, sorted and filtered by the server (see onStatsPage)
+    paged = {} if id is None else {
+        'id':                  id,
+        'pagination_mode':     'be',
+        'pagination_settings': tables.PAGINATION_SETTINGS,
+    }
+    
     return dash_table.DataTable(
         columns=[{"name": i, "id": i} for i in df.columns],
-        data=df.to_dict("rows"),
+        data=df.to_dict("rows") if id is None else tables.page(key, df),
         style_cell={'textAlign': 'left'},
         style_filter={'textAlign': 'left'},
         style_as_list_view=True,
@@ -198,20 +201,23 @@ def table(df):
             'backgroundColor': 'white',
             'fontWeight': 'bold'
         },
-        sorting=True,
-        filtering=True,
+        sorting=True if id is None else 'be',
+        filtering=True if id is None else 'be',
+        **paged
     )
     
- 
 
 
 
-def histogram(df, att, stats=None):
+
+def _histogram(release, name, att):
     
+    bins = profiles.histogram(release, name, att)
     data = [
-        go.Histogram(
-            x=list(df[att]),
-            nbinsx=20,
+        go.Bar(
+            x=bins['x'],
+            y=bins['y'],
+            width=bins['width'],
             name=att
         ),        
     ]
@@ -219,7 +225,8 @@ def histogram(df, att, stats=None):
     return go.Figure(
         data=data,
         layout=go.Layout(
-            title=att,
+            title=bins['title'],
+            xaxis={'type': 'category'} if bins['kind'] == 'categorical' else {},
             showlegend=False,
             autosize=True,
             margin=go.layout.Margin(
@@ -235,9 +242,14 @@ def histogram(df, att, stats=None):
 
 
 
-def tab(df, stats=None):
+def histogram(release, name, att, stats=None):
+    return FIGURES.cached((release, name, att), lambda: _histogram(release, name, att).to_plotly_json(), release)
+
+
+
+def tab(release, name, stats=None):
     
-    cols  = list(df.columns.values)
+    cols  = profiles.columns(release, name)
     rows  = []
         
     for i in range(0, len(cols), 2):
@@ -264,12 +276,12 @@ def tab(df, stats=None):
         rows.append(
             html.Div([
                 html.Div([
-                    dcc.Graph(figure=histogram(df, cols[i] )),
+                    dcc.Graph(figure=histogram(release, name, cols[i] )),
                     #dcc.Markdown(md1)    
                 ], className='six columns'),
                 
                 html.Div([
-                    dcc.Graph(figure=histogram(df, cols[i+1]) if i+1 < len(cols) else None),
+                    dcc.Graph(figure=histogram(release, name, cols[i+1]) if i+1 < len(cols) else None),
                     #dcc.Markdown(md2)    
                 ], className='six columns'),
             ], className='row'),
@@ -280,56 +292,6 @@ def tab(df, stats=None):
     return rows
         
 
-#'''
-RELEASES_FILES_TABS = {
-
-    'R1' : {
-        'Votes' :   tab(RELEASES_FILES_DATAFRAMES['R1']['Votes']),
-        'Badges':   tab(RELEASES_FILES_DATAFRAMES['R1']['Badges']),
-        'Comments': tab(RELEASES_FILES_DATAFRAMES['R1']['Comments']),
-        'Posts':    tab(RELEASES_FILES_DATAFRAMES['R1']['Posts']),
-        'Users':    tab(RELEASES_FILES_DATAFRAMES['R1']['Users']),
-    },
-
-    'R2' : {
-        'Votes' :   tab(RELEASES_FILES_DATAFRAMES['R2']['Votes']),
-        'Badges':   tab(RELEASES_FILES_DATAFRAMES['R2']['Badges']),
-        'Comments': tab(RELEASES_FILES_DATAFRAMES['R2']['Comments']),
-        'Posts':    tab(RELEASES_FILES_DATAFRAMES['R2']['Posts']),
-        'Users':    tab(RELEASES_FILES_DATAFRAMES['R2']['Users']),
-    },
-
-    'R3' : {
-        'Votes' :   tab(RELEASES_FILES_DATAFRAMES['R3']['Votes']),
-        'Badges':   tab(RELEASES_FILES_DATAFRAMES['R3']['Badges']),
-        'Comments': tab(RELEASES_FILES_DATAFRAMES['R3']['Comments']),
-        'Posts':    tab(RELEASES_FILES_DATAFRAMES['R3']['Posts']),
-        'Users':    tab(RELEASES_FILES_DATAFRAMES['R3']['Users']),
-    },
-
-}
-
-#'''
-
-
-RELEASES_STATS = {
-    'R1': release_stats('R1'),
-    'R2': release_stats('R2'),
-    'R3': release_stats('R3'),
-}
-
-'''
-RELEASES_FILES_TABS = {
-
-    'R1' : {
-        'Votes' :   tab(RELEASES_FILES_DATAFRAMES['R1']['Votes'],    RELEASES_STATS['R1']['Votes']),
-        'Badges':   tab(RELEASES_FILES_DATAFRAMES['R1']['Badges'],   RELEASES_STATS['R1']['Badges']),
-        'Comments': tab(RELEASES_FILES_DATAFRAMES['R1']['Comments'], RELEASES_STATS['R1']['Comments']),
-        'Posts':    tab(RELEASES_FILES_DATAFRAMES['R1']['Posts'],    RELEASES_STATS['R1']['Posts']),
-        'Users':    tab(RELEASES_FILES_DATAFRAMES['R1']['Users'],    RELEASES_STATS['R1']['Users']),
-    },
-}
-'''
 
 
 
@@ -341,29 +303,34 @@ RELEASES_FILES_TABS = {
 
 from app import app
 
-layout = html.Div([
+
+# Built on each visit: releases added while the server runs are listed, those
+# with a view only
+def layout():
+    options = registry.options(registry.views())
+    return html.Div([
     
-    dcc.Markdown('# **CURARE VIEWS** in Action'),
-    html.Div([ 
-        dcc.Markdown('## Exploring Stackoverflow Releases'),
-    ], style={'margin-bottom': '30'}),
+        dcc.Markdown('# **CURARE VIEWS** in Action'),
+        html.Div([ 
+            dcc.Markdown('## Exploring Stackoverflow Releases'),
+        ], style={'margin-bottom': '30'}),
     
-    html.Div([
-
-        html.Div(className='three columns', children=[
-            dcc.Markdown('**Release**'),
-            dcc.RadioItems(id='release', options=RELEASES_OPTIONS, value='R1', style={'margin-bottom': '20'}),
-            dcc.Markdown('**Views Attributes**'),
-            dcc.RadioItems(id='operation', options=OPERATIONS_OPTIONS, value='schema'), 
-        ]),
+        html.Div([
+
+            html.Div(className='three columns', children=[
+                dcc.Markdown('**Release**'),
+                dcc.RadioItems(id='release', options=options, value=options[0]['value'] if options else None, style={'margin-bottom': '20'}),
+                dcc.Markdown('**Views Attributes**'),
+                dcc.RadioItems(id='operation', options=OPERATIONS_OPTIONS, value='schema'), 
+            ]),
         
-        html.Div(className='nine columns', children=[
-            html.Div(id='output',    children='[]', ),
-        ]),
+            html.Div(className='nine columns', children=[
+                html.Div(id='output',    children='[]', ),
+            ]),
     
-    ], className='row')
+        ], className='row')
     
-], className='container')
+    ], className='container')
 
 
 
@@ -376,40 +343,28 @@ layout = html.Div([
 ################################################################################
 
 
-@app.callback(
+@cache.callback(app, 'views',
     Output(component_id='output',     component_property='children'),
     [Input(component_id='operation',  component_property='value'),
      Input(component_id='release',    component_property='value')],
 )
 def onOperationSelected(operation, release):
 
+    if release not in registry.RELEASES:
+        return dcc.Markdown(GONE)
+
+    if operation in ('schema', 'stats') and not described(release):
+        return dcc.Markdown('No view for this release')
+
     # Schema
     if operation == 'schema':
-                
-        files   = []
-        schemas = []
-        
-        for i in range(len(VIEWS_SCHEMAS[release])):
-            
-            file_schema = VIEWS_SCHEMAS[release][i]            
-            file_name = file_schema[0]
-            file_atts = []
-            
-            for att_schema in file_schema[1]:                
-                for v in att_schema.values():
-                    file_atts.append(v)
-                           
-            files.append  (file_name)
-            schemas.append(file_atts)
         
         output = []
-        for i in range(len(files)):
+        for name in files(release):
             output.append( 
                 dcc.Tab(
-                    label=files[i],
-                    children=table(
-                        pd.DataFrame(schemas[i], columns=['Attribute', 'Type'])
-                    )  
+                    label=name,
+                    children=table( schema_table(release, name) )  
                 )
             )
         
@@ -420,19 +375,10 @@ def onOperationSelected(operation, release):
 
     # Nulls view
     if operation == 'nulls':
-        v = [sum(desc['nullValue']) for desc in VIEWS[release]['attributeDescList']],
-        l = [viewFile(desc['name']) for desc in VIEWS[release]['attributeDescList']]
-        v = v[0]
-        
         v = []
         l = RELEASES_FILES
         for f in RELEASES_FILES:
-            df = RELEASES_FILES_DATAFRAMES[release][f]
-            x  = 0
-            for col in df.columns:
-                x += df[df[col].isnull()].shape[0]
-            
-            v.append(x)
+            v.append( int(profiles.nulls(release, f)['Nulls'].sum()) )
         
         s = 'Total Number of NULLs: ' + str( sum(v) )
         
@@ -445,13 +391,10 @@ def onOperationSelected(operation, release):
 
     # Count records
     if operation == 'count':
-        v = [         desc['count'] for desc in VIEWS[release]['attributeDescList']]
-        l = [viewFile(desc['name']) for desc in VIEWS[release]['attributeDescList']]
-        
         v = []
         l = RELEASES_FILES
         for f in RELEASES_FILES:
-            v.append( RELEASES_FILES_DATAFRAMES[release][f].shape[0] )
+            v.append( profiles.rows(release, f) )
         
         s = 'Total Number of Records: ' + str(sum(v))
         
@@ -464,42 +407,16 @@ def onOperationSelected(operation, release):
 
 
     if operation == 'stats':
-
-        obj = {
-            'name'   : [viewFile(desc['name']) for desc in VIEWS[release]['attributeDescList']],
-            'min'    : [desc['minValue'] for desc in VIEWS[release]['attributeDescList']],
-            'max'    : [desc['maxValue'] for desc in VIEWS[release]['attributeDescList']],
-            'median' : [desc['median']   for desc in VIEWS[release]['attributeDescList']],
-            'mean'   : [desc['mean']     for desc in VIEWS[release]['attributeDescList']],            
-            'nulls'  : [desc['nullValue']for desc in VIEWS[release]['attributeDescList']],
-        }
         
+        md     = '> `Filters: eq "Asia" | > num(500) | < num(80) | is nil`, combined with && / || '
         output = []
-        for i in range(len(obj['name'])):
-        
-            file_atts=[]
-            for att_schema in VIEWS_SCHEMAS[release][i][1]: 
-                for v in att_schema.values():
-                    file_atts.append(v)       
-                            
-            obj2 = {
-                'Attribute' : [att[0] for att in file_atts],
-                'min'    : obj['min'][i],
-                'max'    : obj['max'][i],
-                'median' : obj['median'][i],
-                'mean'   : obj['mean'][i],
-                'nulls'  : obj['nulls'][i]
-            }
-            
-            
-            md  = '> `Filters: eq "Asia" | > num(500) | < num(80)` '
-            
+        for name in files(release):
             output.append( 
                 dcc.Tab(
-                    label=obj['name'][i],
+                    label=name,
                     children=html.Div(children=[
                         dcc.Markdown(md),
-                        table( pd.DataFrame(obj2) ) 
+                        table( stats_table(release, name), 'views-stats-' + name, ('stats', release, name) ) 
                     ])
                 )
             )
@@ -510,12 +427,11 @@ def onOperationSelected(operation, release):
 
     if operation == 'histo':
         
-        return dcc.Tabs(id="tabs", children=[
-                dcc.Tab(label='Votes',    children=RELEASES_FILES_TABS[release]['Votes']),
-                dcc.Tab(label='Badges',   children=RELEASES_FILES_TABS[release]['Badges']),
-                dcc.Tab(label='Comments', children=RELEASES_FILES_TABS[release]['Comments']),
-                dcc.Tab(label='Posts',    children=RELEASES_FILES_TABS[release]['Posts']),
-                dcc.Tab(label='Users',    children=RELEASES_FILES_TABS[release]['Users']),
+        return html.Div([
+            dcc.Tabs(id="views-histo-tabs", value=releases.RELEASES_FILES[0], children=[
+                dcc.Tab(label=name, value=name) for name in releases.RELEASES_FILES
+            ]),
+            html.Div(id='views-histo-tab'),
         ])
 
 
@@ -525,3 +441,33 @@ def onOperationSelected(operation, release):
 
 
 
+@app.callback(
+    Output(component_id='views-histo-tab',  component_property='children'),
+    [Input(component_id='views-histo-tabs', component_property='value')],
+    [State(component_id='release',          component_property='value')],
+)
+def onHistoTabSelected(name, release):
+    if release not in registry.RELEASES:
+        return dcc.Markdown(GONE)
+    return tab(release, name)
+
+
+
+def onStatsPage(name):
+    def page(pagination, sorting, filtering, release):
+        if release not in registry.RELEASES:
+            return []
+        return tables.page(('stats', release, name), stats_table(release, name), pagination, sorting, filtering)
+    return page
+
+
+
+# One paged stats table per release file
+for name in RELEASES_FILES:
+    app.callback(
+        Output(component_id='views-stats-' + name, component_property='data'),
+        [Input(component_id='views-stats-' + name, component_property='pagination_settings'),
+         Input(component_id='views-stats-' + name, component_property='sorting_settings'),
+         Input(component_id='views-stats-' + name, component_property='filtering_settings')],
+        [State(component_id='release',            component_property='value')],
+    )(onStatsPage(name))
@@ -0,0 +1,88 @@
+import json
+import os
+import pickle
+import shutil
+import sys
+
+
+import analytics
+import cache
+import profiles
+import registry
+import releases
+from apps import raw, views
+
+
+################################################################################
+#
+# ARTIFACTS BUNDLE
+#
+# Every artifact the pages derive from a release (view schemas and stats, null
+# profiles, rankings, histogram bins and figures) computed once and written to
+# one file the app memory-maps at boot, e.g.
+#   python bundle.py          # every release
+#   python bundle.py jan-01-02_2018 jan-03-04_2018
+# Entries carry the release version, and the index the size and digest of each
+# release file and view: a release whose file times changed since (a fresh
+# checkout, a copy) is still served from the bundle, one whose contents changed
+# is computed again until the bundle is built again.
+#
+################################################################################
+
+
+def build(release):
+    for name in releases.RELEASES_FILES:
+        profiles.nulls(release, name)
+        raw.tab(release, name)
+
+    for operation in raw.RANKINGS:
+        raw.RANKINGS[operation](release)
+        analytics.top(operation, release)
+    analytics.tag_index(release)
+
+    if views.described(release):
+        for name in views.files(release):
+            views.schema_table(release, name)
+            views.stats_table(release, name)
+        for name in releases.RELEASES_FILES:
+            views.tab(release, name)
+
+
+
+def write(releases, folder=cache.BUNDLE_FOLDER):
+    entries = {}
+    tmp     = folder + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    with open(os.path.join(tmp, 'artifacts.bin'), 'wb') as f:
+        for kind, store in cache.STORES.items():
+            for key, value in store.items():
+                data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+                entries.setdefault(kind, {})[repr(key)] = [f.tell(), len(data)]
+                f.write(data)
+
+    with open(os.path.join(tmp, 'index.json'), 'w') as f:
+        json.dump({
+            'format':   cache.BUNDLE_FORMAT,
+            'entries':  entries,
+            'releases': {r: dict(registry.contents(r), version=registry.metadata(r)['version']) for r in releases},
+        }, f)
+
+    # Swapped in whole: a worker starting meanwhile reads the old bundle or the new one
+    if os.path.exists(folder):
+        os.replace(folder, folder + '.old')
+    os.replace(tmp, folder)
+    shutil.rmtree(folder + '.old', ignore_errors=True)
+
+    return sum(len(e) for e in entries.values())
+
+
+
+if __name__ == '__main__':
+    # Everything is computed again, whatever the current bundle holds
+    cache.BundleBackend.index = {}
+    built = sys.argv[1:] or list(registry.RELEASES)
+    for release in built:
+        build(release)
+    print('{} artifacts written to {}'.format(write(built), cache.BUNDLE_FOLDER))
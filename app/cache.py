@@ -0,0 +1,490 @@
+import collections
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import shutil
+import sys
+import threading
+
+
+import registry
+import warmup
+
+
+################################################################################
+#
+# CONSTANTS
+#
+################################################################################
+
+# Memory kept for serialized callback responses (bytes), e.g.
+#   CURARE_CACHE_BYTES=536870912 python index.py
+CACHE_BYTES = int(os.environ.get('CURARE_CACHE_BYTES', 128 * 2**20))
+
+
+# Folder of the on-disk tier, shared by every process started on this machine
+# (gunicorn workers, ...); unset keeps responses and artifacts in memory only
+CACHE_DIR = os.environ.get('CURARE_CACHE_DIR') or None
+
+
+# Layout of the on-disk entries: bump it when they change in a way the sources
+# below do not show (e.g. a pinned library upgraded)
+CACHE_FORMAT = 1
+
+
+def code_version(folder=os.path.dirname(os.path.abspath(__file__))):
+    # Digest of CACHE_FORMAT and the app's sources: on-disk responses and
+    # artifacts written by other code are never read
+    digest = hashlib.sha1(str(CACHE_FORMAT).encode('utf8'))
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if d not in ('data', 'assets', '__pycache__'))
+        for name in sorted(files):
+            if name.endswith('.py'):
+                with open(os.path.join(root, name), 'rb') as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+CODE_VERSION = code_version()
+
+
+RESPONSES_DIR = CACHE_DIR and os.path.join(CACHE_DIR, 'responses')
+ARTIFACTS_DIR = CACHE_DIR and os.path.join(CACHE_DIR, 'artifacts', CODE_VERSION)
+
+
+# Disk kept for serialized responses (bytes), least recently used first out, e.g.
+#   CURARE_CACHE_DISK_BYTES=4294967296 python index.py
+CACHE_DISK_BYTES = int(os.environ.get('CURARE_CACHE_DISK_BYTES', 2**30))
+
+
+# Share of the disk budget a process writes before it prunes the responses folder
+PRUNE_SHARE = 0.1
+
+
+# Artifacts bundle written at deploy time by `python bundle.py` (see bundle.py);
+# bundles of another format are ignored
+BUNDLE_FOLDER = os.environ.get('CURARE_BUNDLE', './data/bundle')
+BUNDLE_FORMAT = 1
+
+
+
+################################################################################
+#
+# RESULT CACHE
+#
+# Serialized responses are kept in memory up to `budget` bytes (UTF-8 encoded),
+# least recently used first out. With a folder they are also written to disk,
+# where a process that has not computed them yet (or has evicted them) finds
+# them again. The folder is pruned down to `disk_budget` bytes, oldest files
+# first: a read touches its file, and responses of replaced release versions,
+# never read again, age out.
+#
+################################################################################
+
+
+class ResultCache(object):
+
+    def __init__(self, budget=CACHE_BYTES, folder=RESPONSES_DIR, disk_budget=CACHE_DISK_BYTES):
+        self.budget      = budget
+        self.folder      = folder
+        self.disk_budget = disk_budget
+        self.size        = 0
+        self.entries     = collections.OrderedDict()
+        self.lock        = threading.Lock()
+
+        # Bytes written since the folder was last pruned: the first write prunes
+        # what earlier processes left
+        self.written     = disk_budget
+
+
+    def path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf8')).hexdigest()
+        return os.path.join(self.folder, digest + '.json')
+
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+
+        if self.folder is not None:
+            path = self.path(key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                # Not written yet, or pruned meanwhile by another process
+                return None
+            value = data.decode('utf8')
+            self.remember(key, value, len(data))
+            return value
+
+
+    def remember(self, key, value, size):
+        if size > self.budget:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+
+            self.entries[key] = (value, size)
+            self.size        += size
+
+            while self.size > self.budget:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+
+
+    def put(self, key, value):
+        data = value.encode('utf8')
+        self.remember(key, value, len(data))
+
+        if self.folder is not None:
+            path = self.path(key)
+            tmp  = path + '.{}.tmp'.format(os.getpid())
+            try:
+                os.makedirs(self.folder, exist_ok=True)
+                with open(tmp, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except OSError:
+                return
+
+            with self.lock:
+                self.written += len(data)
+                prune         = self.written > self.disk_budget * PRUNE_SHARE
+                if prune:
+                    self.written = 0
+            if prune:
+                self.prune()
+
+
+    def prune(self):
+        files = []
+        for name in os.listdir(self.folder):
+            if name.endswith('.json'):
+                try:
+                    stat = os.stat(os.path.join(self.folder, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.disk_budget:
+                break
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                pass
+            total -= size
+
+
+    def cached(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+
+RESULTS = ResultCache()
+
+
+
+################################################################################
+#
+# ARTIFACT STORES
+#
+# Derived artifacts (profiles, rankings, figures) of one kind live in a Store:
+# a per-process memory backend in front of a file backend that every process
+# reads from, so a profile or ranking is computed by the first worker asking
+# for it and loaded by the others. Files live under <dir>/artifacts/<code
+# version>/<kind>, so artifacts pickled by other code are never unpickled.
+# Entries of a release are stored under its
+# (release, version) scope: the file backend keeps each scope in a folder of its
+# own, removed when the version is replaced (by the watcher, or by the first
+# write of the new version in a process started after the change).
+#
+################################################################################
+
+
+class MemoryBackend(object):
+
+    def __init__(self):
+        self.values = {}
+
+
+    def get(self, key, scope=None):
+        return self.values.get(key)
+
+
+    def put(self, key, value, scope=None):
+        self.values[key] = value
+
+
+    def evict(self, release, version=None):
+        # Keys of a release end with its version (see Store.key)
+        for key in [k for k in self.values if release in k and (version is None or k[-1] == version)]:
+            del self.values[key]
+
+
+
+class FileBackend(object):
+
+    def __init__(self, folder):
+        self.folder  = folder
+        self.written = set()
+        self.lock    = threading.Lock()
+
+
+    def scope(self, scope):
+        # folder/<release>/<version> for the entries of a release, folder otherwise
+        return self.folder if scope is None else os.path.join(self.folder, *scope)
+
+
+    def path(self, key, scope=None):
+        digest = hashlib.sha1(repr(key).encode('utf8')).hexdigest()
+        return os.path.join(self.scope(scope), digest + '.pkl')
+
+
+    def get(self, key, scope=None):
+        try:
+            with open(self.path(key, scope), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+
+    def put(self, key, value, scope=None):
+        if scope is not None:
+            self.prune(*scope)
+
+        # Written aside then renamed: readers in other processes never see half a file
+        path = self.path(key, scope)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.{}.tmp'.format(os.getpid()), 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + '.{}.tmp'.format(os.getpid()), path)
+        except (OSError, pickle.PicklingError):
+            pass
+
+
+    def prune(self, release, version):
+        # The first write of a version removes the other versions of its release,
+        # left by processes that ran before the release was replaced
+        with self.lock:
+            if (release, version) in self.written:
+                return
+            self.written.add((release, version))
+
+        try:
+            versions = os.listdir(self.scope((release,)))
+        except OSError:
+            return
+        for other in versions:
+            if other != version:
+                self.evict(release, other)
+
+
+    def evict(self, release, version=None):
+        shutil.rmtree(self.scope((release,) if version is None else (release, version)), ignore_errors=True)
+        with self.lock:
+            self.written.discard((release, version))
+
+
+
+class BundleBackend(object):
+    # Read-only: one memory-mapped file of pickled artifacts and its index,
+    # {kind: {repr(key): [offset, length]}}. Opening it only reads the index,
+    # and the contents of the releases whose version differs from the one the
+    # bundle was built with (file times change with a checkout or a copy):
+    # entries of a release holding the same files are served under its new version.
+
+    index    = None
+    data     = None
+    versions = {}
+    lock     = threading.Lock()
+
+
+    def __init__(self, kind):
+        self.kind = kind
+
+
+    @classmethod
+    def open(cls, folder=BUNDLE_FOLDER):
+        with cls.lock:
+            if cls.index is not None:
+                return
+            try:
+                with open(os.path.join(folder, 'index.json')) as f:
+                    index = json.load(f)
+                with open(os.path.join(folder, 'artifacts.bin'), 'rb') as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+            except (OSError, ValueError):
+                index, data = {}, b''
+
+            cls.data     = data
+            cls.index    = index['entries'] if index.get('format') == BUNDLE_FORMAT else {}
+            cls.versions = cls.match(index.get('releases', {})) if cls.index else {}
+
+
+    @staticmethod
+    def match(built):
+        # {(release, version): version the bundle holds its entries under}
+        versions = {}
+        for release, meta in registry.RELEASES.items():
+            b = built.get(release)
+            if b is None or b['version'] == meta['version']:
+                continue
+
+            sizes = {name: f['size'] for name, f in meta['files'].items()}
+            if sizes == {name: size for name, (size, _) in b['files'].items()} and registry.contents(release) == {'files': b['files'], 'view': b['view']}:
+                versions[(release, meta['version'])] = b['version']
+            else:
+                print('Bundle entries of {} ignored: its files differ from those the bundle was built with'.format(release), file=sys.stderr)
+
+        return versions
+
+
+    def get(self, key, scope=None):
+        self.open()
+        if scope in self.versions:
+            key = key[:-1] + (self.versions[scope],)
+        entry = self.index.get(self.kind, {}).get(repr(key))
+        if entry is not None:
+            return pickle.loads(self.data[entry[0]:entry[0] + entry[1]])
+
+
+    def put(self, key, value, scope=None):
+        pass
+
+
+    def evict(self, release, version=None):
+        # Entries of other versions are never read; they go with the next bundle
+        pass
+
+
+
+def drop_other_versions(folder=ARTIFACTS_DIR):
+    # Artifacts pickled by other code (<dir>/artifacts/<code version>/<kind>)
+    # are never read: the first store of a process removes them
+    parent = os.path.dirname(folder)
+    try:
+        versions = os.listdir(parent)
+    except OSError:
+        return
+    for version in versions:
+        if version != os.path.basename(folder):
+            shutil.rmtree(os.path.join(parent, version), ignore_errors=True)
+
+
+
+def backends(kind):
+    layers = [MemoryBackend(), BundleBackend(kind)]
+    if ARTIFACTS_DIR is not None:
+        if not STORES:
+            drop_other_versions()
+        layers.append(FileBackend(os.path.join(ARTIFACTS_DIR, kind)))
+    return layers
+
+
+
+# Every store, by kind (bundle.py writes their contents)
+STORES = collections.OrderedDict()
+
+
+class Store(object):
+
+    def __init__(self, kind, backends=backends):
+        self.kind     = kind
+        self.backends = backends(kind)
+        self.locks    = {}
+        self.lock     = threading.Lock()
+        STORES[kind]  = self
+
+
+    def items(self):
+        return list(self.backends[0].values.items())
+
+
+    def scope(self, release):
+        return None if release is None else (release, registry.metadata(release)['version'])
+
+
+    def key(self, key, scope):
+        # Shared entries carry the release version: a replaced file is computed again
+        return key if scope is None else key + (scope[1],)
+
+
+    def cached(self, key, compute, release=None):
+        scope = self.scope(release)
+        key   = self.key(key, scope)
+        value = self.backends[0].get(key)
+        if value is not None:
+            return value
+
+        # Concurrent callbacks asking for the same artifact wait for a single computation
+        with self.lock:
+            lock = self.locks.setdefault(key, threading.Lock())
+
+        with lock:
+            for i, backend in enumerate(self.backends):
+                value = backend.get(key, scope)
+                if value is not None:
+                    break
+            else:
+                value, i = compute(), len(self.backends)
+
+            for backend in self.backends[:i]:
+                backend.put(key, value, scope)
+
+        return value
+
+
+    def evict(self, release, version=None):
+        # Entries of a release, or of one version of it
+        for backend in self.backends:
+            backend.evict(release, version)
+
+
+
+################################################################################
+#
+# CACHED CALLBACKS
+#
+################################################################################
+
+
+def callback(app, page, output, inputs, state=[], results=RESULTS):
+    # app.callback for callbacks whose output depends on their inputs alone: the
+    # serialized response is kept under (code version, page, inputs, versions of
+    # the releases among the inputs) and sent as is the next time
+    def wrap(func):
+        serialize = app.callback(output, inputs, state)(func)
+
+        def memoized(*args):
+            releases = [a for a in args if isinstance(a, str) and a in registry.RELEASES]
+            for release in releases:
+                warmup.request(release)
+
+            versions = tuple(registry.metadata(r)['version'] for r in releases)
+            return results.cached((CODE_VERSION, page, func.__name__) + args + versions, lambda: serialize(*args))
+
+        app.callback_map['{}.{}'.format(output.component_id, output.component_property)]['callback'] = memoized
+        return memoized
+
+    return wrap
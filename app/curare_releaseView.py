@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 import timeit
 import ipywidgets as widgets
 import time, threading
@@ -8,6 +9,19 @@ from pymongo import MongoClient
 import pprint
 import urllib.parse
 import matplotlib.pyplot as plt 
+import argparse
+import collections
+import concurrent.futures
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+import partials
+import registry
+import releases
 
 
 def getViewsMongo():
@@ -17,6 +31,68 @@ def getViewsMongo():
     collection = db['viewModel-view']
     return collection
 
+# Descriptor fields no page reads (jsonpickle'd numpy scalars, distributions)
+VIEW_SKIPPED_FIELDS = ('mode', 'valueDistribution')
+
+# Per-attribute descriptor fields decoded into arrays
+VIEW_ARRAY_FIELDS = ('minValue', 'maxValue', 'mean', 'median', 'nullValue', 'absentValue')
+
+def skipViewFields(pairs):
+    return {k: v for k, v in pairs if k not in VIEW_SKIPPED_FIELDS}
+
+def compactDescriptor(desc):
+    compact = {
+        'name':       desc['name'],
+        'count':      desc['count'],
+        'attributes': [t['py/tuple'][0] for t in desc['_type']],
+        'types':      [t['py/tuple'][1] for t in desc['_type']],
+    }
+    for field in VIEW_ARRAY_FIELDS:
+        compact[field] = np.asarray(desc[field])
+    return compact
+
+def loadReleaseView(path):
+    # Decodes a jsonpickle'd ReleaseView into plain per-file arrays, with orjson
+    # when installed, leaving out the fields listed in VIEW_SKIPPED_FIELDS
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if orjson is not None:
+        view = orjson.loads(data)
+    else:
+        view = json.loads(data.decode('utf8'), object_pairs_hook=skipViewFields)
+
+    return {
+        '_id':               view.get('_id'),
+        'attributeDescList': [compactDescriptor(desc) for desc in view['attributeDescList']],
+    }
+
+class ReleaseView(object):
+    # A decoded view indexed once by collection (release file) name, each
+    # descriptor's attributes and stats kept as is
+    __slots__ = ('names', 'folders', 'attributes', 'types', 'fields', 'collections', 'offsets')
+
+    def __init__(self, view):
+        descs = view['attributeDescList']
+        sizes = [len(desc['attributes']) for desc in descs]
+
+        self.names       = [fileName(desc['name']) for desc in descs]
+        self.folders     = sorted(set(os.path.basename(os.path.dirname(desc['name'])) for desc in descs))
+        self.attributes  = [list(desc['attributes']) for desc in descs]
+        self.types       = [list(desc['types']) for desc in descs]
+        self.fields      = {field: [desc[field] for desc in descs] for field in VIEW_ARRAY_FIELDS}
+        self.collections = {name: i for i, name in enumerate(self.names)}
+        self.offsets     = np.concatenate([[0], np.cumsum(sizes)]).astype(int).tolist()
+
+    @classmethod
+    def load(cls, path):
+        return cls(loadReleaseView(path))
+
+    def rows(self, name):
+        # Rows of a collection's attributes when every collection's are laid end to end
+        i = self.collections[name]
+        return slice(self.offsets[i], self.offsets[i + 1])
+
 def getReleaseViewNullValues(view):
     nullsView=[]
     for i in view['attributeDescList']:
@@ -100,4 +176,157 @@ def plotViewReleasesRecordsNumber(releases, attributes, yLabels, xlabel, ylabel,
     plt.legend() 
     # function to show the plot 
     plt.show() 
-    
\ No newline at end of file
+    
+
+################################################################################
+#
+# RELEASE VIEW BUILDER
+#
+# Computes the jsonpickle'd ReleaseView documents read by apps/views.py from
+# the CSV files of a release folder, one worker process per file:
+#
+#   python curare_releaseView.py data/releases/jan-01-02_2018 data/views/jan-01-02_2018.json
+#
+# Given several release folders, builds their rollup view instead:
+#
+#   python curare_releaseView.py data/releases/jan-0* data/views/jan_2018.json
+#
+################################################################################
+
+def fileName(path):
+    return registry.FILE_NAME.match(os.path.basename(path)).group(1).capitalize()
+
+def readOptions(path):
+    return releases.csv_options(os.path.basename(os.path.dirname(path)), fileName(path))
+
+def readReleaseFile(path):
+    return releases.parse(path, fileName(path), readOptions(path))[0]
+
+def readReleaseChunks(path, chunksize):
+    return releases.parse_chunks(path, fileName(path), chunksize, readOptions(path))
+
+
+#
+# File partials
+#
+# Each release file's partial (see partials.py), cached next to the parsed
+# releases and keyed like them by source path, size and mtime.
+#
+
+PARTIALS_FOLDER = os.path.join(releases.CACHE_FOLDER, 'partials')
+
+def frameFilePartial(path, df):
+    nulls = partials.null_profile(df)['Nulls'].values
+    return {
+        'name':       '../releases/{}/{}'.format(os.path.basename(os.path.dirname(path)), os.path.basename(path)),
+        'file':       registry.FILE_NAME.match(os.path.basename(path)).group(1).upper(),
+        'rows':       int(df.shape[0]),
+        'attributes': [partials.attributePartial(df[col], n) for col, n in zip(df.columns, nulls)],
+    }
+
+def filePartial(path, chunksize=None):
+    key    = releases.cache_key(path, readOptions(path))
+    cached = os.path.join(PARTIALS_FOLDER, '{}.v{}.json'.format(key, partials.PARTIALS_FORMAT))
+    if os.path.exists(cached):
+        with open(cached) as f:
+            return json.load(f)
+
+    if chunksize is None:
+        partial = frameFilePartial(path, readReleaseFile(path))
+    else:
+        # Streaming mode: at most chunksize rows are held at once, and the
+        # partials they fold into are bounded by SKETCH_SIZE and MODE_SIZE (see partials.py)
+        partial = None
+        for df in readReleaseChunks(path, chunksize):
+            chunk   = frameFilePartial(path, df)
+            partial = chunk if partial is None else partials.mergeFilePartials([partial, chunk], chunk['name'])
+
+    try:
+        os.makedirs(PARTIALS_FOLDER, exist_ok=True)
+        for f in os.listdir(PARTIALS_FOLDER):
+            if f.startswith(key.split('.')[0] + '.'):
+                os.remove(os.path.join(PARTIALS_FOLDER, f))
+        with open(cached + '.tmp', 'w') as f:
+            json.dump(partial, f)
+        os.replace(cached + '.tmp', cached)
+    except OSError:
+        pass
+
+    return partial
+
+def descriptorFromPartial(partial, source=None):
+    atts = partial['attributes']
+    return {
+        'py/object':   '__main__.AttributeDescriptor',
+        '_id':         source,
+        '_type':       [{'py/tuple': [att['name'], att['type']]} for att in atts],
+        'absentValue': [att['absent'] for att in atts],
+        'count':       partial['rows'],
+        'maxValue':    [att['max'] if att['count'] else 0 for att in atts],
+        'mean':        [att['sum'] / att['count'] if att['count'] else 0.0 for att in atts],
+        'median':      [partials.sketchMedian(att['sketch']) for att in atts],
+        'minValue':    [att['min'] if att['count'] else 0 for att in atts],
+        'mode':        [att['modes'][0][0] if att['modes'] else None for att in atts],
+        'name':        partial['name'],
+        'nullValue':   [att['nulls'] for att in atts],
+        'valueDistribution': None,
+    }
+
+def releaseFilePaths(releaseFolder):
+    return sorted(
+        os.path.join(releaseFolder, f) for f in os.listdir(releaseFolder) if registry.FILE_NAME.match(f)
+    )
+
+def releaseFilePartials(paths, processes=None, chunksize=None):
+    # Only files without an up-to-date cached partial are scanned
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(filePartial, paths, [chunksize] * len(paths)))
+
+def releaseView(descriptors, source=None):
+    return {
+        'py/object':         '__main__.ReleaseView',
+        '_id':               source,
+        'attributeDescList': descriptors,
+        'license':           None,
+        'publicationDate':   None,
+        'size':              None,
+        'version':           None,
+    }
+
+def buildReleaseView(releaseFolder, source=None, processes=None, chunksize=None):
+    filePartials = releaseFilePartials(releaseFilePaths(releaseFolder), processes, chunksize)
+    return releaseView([descriptorFromPartial(p, source) for p in filePartials], source)
+
+def buildRollupView(releaseFolders, source=None, processes=None, chunksize=None):
+    paths    = [p for folder in releaseFolders for p in releaseFilePaths(folder)]
+    byFile   = collections.OrderedDict()
+    for p in releaseFilePartials(paths, processes, chunksize):
+        byFile.setdefault(p['file'], []).append(p)
+
+    span = '{}..{}'.format(os.path.basename(os.path.normpath(releaseFolders[0])), os.path.basename(os.path.normpath(releaseFolders[-1])))
+    return releaseView([
+        descriptorFromPartial(partials.mergeFilePartials(ps, '../releases/{}/{}_{}.csv'.format(span, f, span)), source)
+        for f, ps in byFile.items()
+    ], source)
+
+def saveReleaseView(view, path):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(view, f)
+    os.replace(path + '.tmp', path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the CURARE view of a release folder, or the rollup view of several')
+    parser.add_argument('release', nargs='+', help='release folder(s), e.g. data/releases/jan-01-02_2018')
+    parser.add_argument('view',    help='output file, e.g. data/views/jan-01-02_2018.json')
+    parser.add_argument('--source',    default=None, help='URL of the dump the release comes from')
+    parser.add_argument('--processes', default=None, type=int, help='worker processes (default: one per core)')
+    parser.add_argument('--chunksize', default=None, type=int, help='stream CSVs this many rows at a time')
+    args = parser.parse_args()
+
+    if len(args.release) == 1:
+        view = buildReleaseView(args.release[0], args.source, args.processes, args.chunksize)
+    else:
+        view = buildRollupView(args.release, args.source, args.processes, args.chunksize)
+
+    saveReleaseView(view, args.view)
@@ -0,0 +1,272 @@
+import numpy as np
+import pandas as pd
+
+import collections
+import numbers
+import re
+
+
+################################################################################
+#
+# CONSTANTS
+#
+################################################################################
+
+# Compiled expressions kept (least recently used dropped first)
+COMPILED_SIZE = 256
+
+
+# Tokens of the dash_table filtering language, tried in this order, e.g.
+#   "Reputation" > num(500) && "Location" eq "Asia"
+#   ("Views" ge 10 || "Views" is nil) and !("DisplayName" eq 'nick')
+TOKENS = [
+    ('space',  re.compile(r'\s+')),
+    ('open',   re.compile(r'\(')),
+    ('close',  re.compile(r'\)')),
+    ('and',    re.compile(r'(and\s|&&)', re.I)),
+    ('or',     re.compile(r'(or\s|\|\|)', re.I)),
+    ('is',     re.compile(r'is (nil|odd|even|bool|num|object|str|prime)\b', re.I)),
+    ('op',     re.compile(r'(>=|<=|!=|>|<|=|(ge|le|gt|lt|eq|ne)\b)', re.I)),
+    ('not',    re.compile(r'!')),
+    ('value',  re.compile(r'''((num|str)\([^()]*\))|('([^'\\]|\\.)+')|("([^"\\]|\\.)+")|(`([^`\\]|\\.)+`)|([\w:.\-+])+''')),
+]
+
+
+OPERATORS = {
+    'eq': np.equal,         '=':  np.equal,
+    'ne': np.not_equal,     '!=': np.not_equal,
+    'gt': np.greater,       '>':  np.greater,
+    'ge': np.greater_equal, '>=': np.greater_equal,
+    'lt': np.less,          '<':  np.less,
+    'le': np.less_equal,    '<=': np.less_equal,
+}
+
+
+
+################################################################################
+#
+# Helper Functions
+#
+################################################################################
+
+
+def tokens(expression):
+    i = 0
+    while i < len(expression):
+        for kind, rex in TOKENS:
+            m = rex.match(expression, i)
+            if m is not None:
+                break
+        else:
+            raise ValueError('Unexpected {!r} in filter {!r}'.format(expression[i:], expression))
+
+        if kind != 'space':
+            yield kind, m.group(0).strip()
+        i = m.end()
+
+
+
+def unquote(value):
+    if len(value) > 1 and value[0] == value[-1] and value[0] in '\'"`':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+
+
+def literal(value):
+    m = re.match(r'^(num|str)\((.*)\)$', value)
+    if m is not None:
+        return float(m.group(2)) if m.group(1) == 'num' else m.group(2)
+
+    if value[0] in '\'"`':
+        return unquote(value)
+
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+
+def numeric(column):
+    return column.dtype != bool and pd.api.types.is_numeric_dtype(column)
+
+
+
+def is_prime(values):
+    primes = np.zeros(len(values), dtype=bool)
+    whole  = np.isfinite(values) & (np.mod(values, 1) == 0) & (values >= 2)
+    if not whole.any():
+        return primes
+
+    ints  = values[whole].astype(np.int64)
+    sieve = np.ones(ints.max() + 1, dtype=bool)
+    sieve[:2] = False
+    for i in range(2, int(ints.max() ** 0.5) + 1):
+        if sieve[i]:
+            sieve[i*i::i] = False
+
+    primes[whole] = sieve[ints]
+    return primes
+
+
+
+################################################################################
+#
+# MASKS
+#
+# An expression compiles to a function of a DataFrame returning a boolean
+# array, built from vectorised comparisons over whole columns.
+#
+################################################################################
+
+
+def relation(field, operator, value):
+    compare = OPERATORS[operator.lower()]
+
+    def mask(df):
+        if field not in df.columns:
+            return np.zeros(len(df), dtype=bool)
+
+        column = df[field]
+        if numeric(column):
+            try:
+                with np.errstate(invalid='ignore'):
+                    return compare(column.values.astype(float), float(value))
+            except ValueError:
+                pass
+
+        # Anything else compares as text; NULLs never match
+        return compare(column.values.astype(str), str(value)) & column.notnull().values
+
+    return mask
+
+
+
+def unary(field, operator):
+    check = operator.lower().split()[1]
+
+    def mask(df):
+        if field not in df.columns:
+            return np.zeros(len(df), dtype=bool)
+
+        column = df[field]
+        if check == 'nil':
+            return column.isnull().values
+
+        if numeric(column):
+            values = column.values.astype(float)
+            if check == 'num':
+                return np.isfinite(values)
+            if check in ('odd', 'even'):
+                with np.errstate(invalid='ignore'):
+                    return np.mod(values, 2) == (1 if check == 'odd' else 0)
+            if check == 'prime':
+                return is_prime(values)
+            return np.zeros(len(df), dtype=bool)
+
+        kinds = {
+            'bool':   lambda v: isinstance(v, (bool, np.bool_)),
+            'num':    lambda v: isinstance(v, numbers.Number) and not isinstance(v, (bool, np.bool_)) and v == v,
+            'str':    lambda v: isinstance(v, str),
+            'object': lambda v: isinstance(v, (dict, list)),
+        }
+        if check in kinds:
+            return column.map(kinds[check]).values.astype(bool)
+        return np.zeros(len(df), dtype=bool)
+
+    return mask
+
+
+
+class Parser(object):
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens     = list(tokens(expression))
+        self.i          = 0
+
+
+    def peek(self):
+        return self.tokens[self.i][0] if self.i < len(self.tokens) else None
+
+
+    def take(self, kind):
+        if self.peek() != kind:
+            raise ValueError('Expected {} in filter {!r}'.format(kind, self.expression))
+        self.i += 1
+        return self.tokens[self.i - 1][1]
+
+
+    def parse(self):
+        mask = self.disjunction()
+        if self.peek() is not None:
+            raise ValueError('Unexpected {!r} in filter {!r}'.format(self.tokens[self.i][1], self.expression))
+        return mask
+
+
+    def disjunction(self):
+        masks = [self.conjunction()]
+        while self.peek() == 'or':
+            self.take('or')
+            masks.append(self.conjunction())
+        return masks[0] if len(masks) == 1 else lambda df: np.logical_or.reduce([m(df) for m in masks])
+
+
+    def conjunction(self):
+        masks = [self.negation()]
+        while self.peek() == 'and':
+            self.take('and')
+            masks.append(self.negation())
+        return masks[0] if len(masks) == 1 else lambda df: np.logical_and.reduce([m(df) for m in masks])
+
+
+    def negation(self):
+        if self.peek() == 'not':
+            self.take('not')
+            mask = self.negation()
+            return lambda df: ~mask(df)
+
+        if self.peek() == 'open':
+            self.take('open')
+            mask = self.disjunction()
+            self.take('close')
+            return mask
+
+        field = unquote(self.take('value'))
+        if self.peek() == 'is':
+            return unary(field, self.take('is'))
+
+        operator = self.take('op')
+        return relation(field, operator, literal(self.take('value')))
+
+
+
+# Compiled expressions, so repeated edits and page requests skip parsing
+COMPILED = collections.OrderedDict()
+
+
+def compiled(expression):
+    if expression in COMPILED:
+        COMPILED.move_to_end(expression)
+        return COMPILED[expression]
+
+    mask = Parser(expression).parse()
+
+    COMPILED[expression] = mask
+    if len(COMPILED) > COMPILED_SIZE:
+        COMPILED.popitem(last=False)
+
+    return mask
+
+
+
+def mask(df, expression):
+    if not expression or not expression.strip():
+        return np.ones(len(df), dtype=bool)
+    return np.asarray(compiled(expression)(df), dtype=bool)
+
+
+
+def apply(df, expression):
+    return df[mask(df, expression)]
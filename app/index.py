@@ -4,9 +4,21 @@ import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
 
+import json
+import os
+
+
 from app  import app
 from apps import game, views, raw
 
+import bundle
+import cache
+import warmup
+import watcher
+
+
+# Artifacts precomputed by bundle.py are served from the start
+cache.BundleBackend.open()
 
 
 app.layout = html.Div([
@@ -22,16 +34,30 @@ def display_page(pathname):
     if   pathname == '/game':
          return game.layout
     elif pathname == '/raw':
-         return raw.layout         
+         return raw.layout()
     elif pathname == '/views':
-         return views.layout
+         return views.layout()
     else:
         return game.layout
 
 
 
+# Answers as soon as the server listens, whatever is still warming up
+@app.server.route('/health')
+def health():
+    return json.dumps(warmup.status())
+
+
+
 if __name__ == '__main__':
-    app.run_server(host='0.0.0.0', debug=True)
+    debug = True
+
+    # With the reloader on, the server (and its warm-up) runs in a child process
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warmup.start(bundle.build)
+        watcher.start()
+
+    app.run_server(host='0.0.0.0', debug=debug)
     
     
  
\ No newline at end of file
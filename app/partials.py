@@ -0,0 +1,215 @@
+import numpy as np
+import pandas as pd
+
+import collections
+
+
+################################################################################
+#
+# CONSTANTS
+#
+################################################################################
+
+# Centroids kept per quantile sketch
+SKETCH_SIZE = 256
+
+
+# Most frequent values kept per attribute
+MODE_SIZE = 20
+
+
+# Layout of the partials; those cached with another one are computed again
+PARTIALS_FORMAT = 2
+
+
+
+################################################################################
+#
+# NULL PROFILES
+#
+################################################################################
+
+
+def null_profile(df):
+    isnull = df.isnull()
+    nulls  = isnull.sum()
+    ratio  = isnull.mean().round(2)
+
+    return pd.DataFrame({
+        'Attribute': nulls.index.values,
+        'Nulls':     nulls.values,
+        'Ratio (%)': ratio.values,
+    }, columns=['Attribute', 'Nulls', 'Ratio (%)'])
+
+
+
+def partial_null_profile(partial):
+    atts = partial['attributes']
+    return pd.DataFrame({
+        'Attribute': [att['name'] for att in atts],
+        'Nulls':     [att['nulls'] for att in atts],
+        'Ratio (%)': [round(att['nulls'] / partial['rows'], 2) if partial['rows'] else np.nan for att in atts],
+    }, columns=['Attribute', 'Nulls', 'Ratio (%)'])
+
+
+
+################################################################################
+#
+# PARTIAL AGGREGATES
+#
+# A release file is summarised once into per-attribute partials (counts, NULLs,
+# sum, min/max, a quantile sketch and the most frequent values). Partials of
+# the same file type merge into the partial of their union, so views of new
+# releases and multi-release rollups are built without rescanning CSVs. Only
+# numpy and pandas are needed here: the view builder (curare_releaseView.py)
+# and the pages (profiles.py) both import this module.
+#
+################################################################################
+
+
+def attributeType(column):
+    # Type names of the shipped views (int, string, timestamp, boolean); float
+    # only for fractional numbers, which they never hold
+    if column.dtype == bool:
+        return 'boolean'
+    if np.issubdtype(column.dtype, np.integer):
+        return 'int'
+    if np.issubdtype(column.dtype, np.floating):
+        # Integers padded with NaN
+        return 'int' if np.all(np.mod(column.dropna().values, 1) == 0) else 'float'
+    if np.issubdtype(column.dtype, np.datetime64):
+        return 'timestamp'
+
+    present = column.dropna()
+    if str(column.name).endswith('Date') and len(present) and pd.to_datetime(present, errors='coerce').notnull().all():
+        return 'timestamp'
+    return 'string'
+
+
+
+def attributeValues(column):
+    values = column.dropna()
+    if values.dtype == bool:
+        return values.values.astype(int)
+    if np.issubdtype(values.dtype, np.number):
+        return values.values.astype(float)
+    # Text attributes are described by the length of their values
+    return values.astype(str).str.len().values.astype(float)
+
+
+
+def jsonValue(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+
+def sketch(values, weights=None):
+    # Sorted [value, weight] centroids, exact while there are few distinct values
+    if weights is None:
+        values, weights = np.unique(values, return_counts=True)
+    else:
+        order   = np.argsort(values, kind='mergesort')
+        values  = np.asarray(values, dtype=float)[order]
+        weights = np.asarray(weights, dtype=float)[order]
+
+    if len(values) <= SKETCH_SIZE:
+        return [[float(v), float(w)] for v, w in zip(values, weights)]
+
+    # Equal-weight buckets of adjacent values
+    cum     = np.cumsum(weights)
+    bucket  = np.minimum(((cum - weights) * SKETCH_SIZE // cum[-1]).astype(int), SKETCH_SIZE - 1)
+    w       = np.bincount(bucket, weights=weights)
+    v       = np.bincount(bucket, weights=values * weights)
+    keep    = w > 0
+
+    return [[float(a), float(b)] for a, b in zip(v[keep] / w[keep], w[keep])]
+
+
+
+def sketchMedian(centroids):
+    if not centroids:
+        return 0
+    values, weights = np.array(centroids).T
+    cum  = np.cumsum(weights)
+    half = cum[-1] / 2
+    i    = np.searchsorted(cum, half)
+
+    # Half the weight ends exactly on a centroid: the median lies between it and the next
+    if i + 1 < len(values) and np.isclose(cum[i], half):
+        return jsonValue((values[i] + values[i + 1]) / 2)
+    return jsonValue(values[i])
+
+
+
+def mergeSketches(sketches):
+    centroids = [c for s in sketches for c in s]
+    if not centroids:
+        return []
+    values, weights = np.array(centroids).T
+    return sketch(values, weights)
+
+
+
+def topValues(counts):
+    return sorted(counts, key=lambda vc: -vc[1])[:MODE_SIZE]
+
+
+
+def attributePartial(column, nulls):
+    values  = attributeValues(column)
+    present = column.dropna()
+    kind    = attributeType(column)
+    counts  = present.value_counts().head(MODE_SIZE)
+
+    return {
+        'name':   column.name,
+        'type':   kind,
+        'count':  int(values.size),
+        'nulls':  int(nulls),
+        'absent': int((present.astype(str).str.strip() == '').sum()) if kind == 'string' else 0,
+        'sum':    float(values.sum()),
+        'min':    jsonValue(values.min()) if values.size else None,
+        'max':    jsonValue(values.max()) if values.size else None,
+        'sketch': sketch(values),
+        'modes':  [[jsonValue(v), int(c)] for v, c in counts.items()],
+    }
+
+
+
+def mergeAttributePartials(partials):
+    # Partials without a value (e.g. a chunk of NULLs) say nothing of the type
+    types = set(p['type'] for p in partials if p['count']) or set(p['type'] for p in partials)
+    mins  = [p['min'] for p in partials if p['min'] is not None]
+    maxs  = [p['max'] for p in partials if p['max'] is not None]
+    modes = {}
+    for p in partials:
+        for v, c in p['modes']:
+            modes[v] = modes.get(v, 0) + c
+
+    return {
+        'name':   partials[0]['name'],
+        'type':   types.pop() if len(types) == 1 else ('float' if types <= {'int', 'float'} else 'string'),
+        'count':  sum(p['count']  for p in partials),
+        'nulls':  sum(p['nulls']  for p in partials),
+        'absent': sum(p['absent'] for p in partials),
+        'sum':    sum(p['sum']    for p in partials),
+        'min':    min(mins) if mins else None,
+        'max':    max(maxs) if maxs else None,
+        'sketch': mergeSketches([p['sketch'] for p in partials]),
+        'modes':  [list(vc) for vc in topValues(modes.items())],
+    }
+
+
+
+def mergeFilePartials(partials, name):
+    attributes = collections.OrderedDict()
+    for p in partials:
+        for att in p['attributes']:
+            attributes.setdefault(att['name'], []).append(att)
+
+    return {
+        'name':       name,
+        'file':       partials[0]['file'],
+        'rows':       sum(p['rows'] for p in partials),
+        'attributes': [mergeAttributePartials(atts) for atts in attributes.values()],
+    }
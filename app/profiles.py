@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+
+
+import cache
+import curare_releaseView as cr_View
+import partials
+import registry
+import releases
+
+
+################################################################################
+#
+# CONSTANTS
+#
+################################################################################
+
+# Bars per numeric histogram
+BINS = 20
+
+
+# Bars per categorical histogram (most frequent values)
+TOP_VALUES = 20
+
+
+# Text columns whose values average more characters than this are profiled by
+# length (Body, AboutMe, Text, ...) instead of by value
+LONG_TEXT = 40
+
+
+# Release files larger than this (bytes) are never loaded whole: their counts,
+# NULLs and histograms come from partial aggregates streamed CHUNK_ROWS at a time
+STREAMING_SIZE = 512 * 2**20
+CHUNK_ROWS     = 100000
+
+
+
+################################################################################
+#
+# STREAMING PROFILES
+#
+################################################################################
+
+
+def streamed(release, name):
+    return registry.metadata(release)['files'][name]['size'] > STREAMING_SIZE
+
+
+
+# Partial aggregates of each streamed (release, file)
+PARTIALS = cache.Store('partials')
+
+
+def partial(release, name):
+    return PARTIALS.cached((release, name), lambda: cr_View.filePartial(releases.path(release, name), chunksize=CHUNK_ROWS), release)
+
+
+
+def rows(release, name):
+    if streamed(release, name):
+        return partial(release, name)['rows']
+    return releases.rows(release, name)
+
+
+
+################################################################################
+#
+# NULL PROFILES
+#
+################################################################################
+
+
+# Null profile of each (release, file), computed the first time a page needs it
+NULLS = cache.Store('nulls')
+
+
+def _nulls(release, name):
+    if streamed(release, name):
+        return partials.partial_null_profile(partial(release, name))
+    return partials.null_profile(releases.dataframe(release, name))
+
+
+
+def nulls(release, name):
+    return NULLS.cached((release, name), lambda: _nulls(release, name), release)
+
+
+
+################################################################################
+#
+# HISTOGRAMS
+#
+# Columns are binned here so figures carry at most BINS / TOP_VALUES bars
+# whatever the number of rows.
+#
+################################################################################
+
+
+def numeric_bins(values, bins=BINS, weights=None):
+    finite = np.isfinite(values)
+    values = values[finite]
+    if weights is not None:
+        weights = weights[finite]
+    if values.size == 0:
+        return [], [], []
+
+    lo, hi = values.min(), values.max()
+
+    # Small integer ranges get one bar per value
+    if np.all(np.mod(values, 1) == 0) and hi - lo < bins:
+        edges = np.arange(lo, hi + 2) - 0.5
+    else:
+        edges = np.histogram_bin_edges(values, bins=bins, range=(lo, hi) if hi > lo else (lo - 0.5, hi + 0.5))
+
+    counts, edges = np.histogram(values, bins=edges, weights=weights)
+    centers = (edges[:-1] + edges[1:]) / 2
+
+    return centers.tolist(), counts.tolist(), np.diff(edges).tolist()
+
+
+
+def histogram_bins(series, bins=BINS, top=TOP_VALUES):
+    values = series.dropna()
+
+    # Dates are binned over time; bar widths are in milliseconds on a date axis
+    if pd.api.types.is_datetime64_dtype(values):
+        start       = values.values.min().astype(np.int64)
+        x, y, width = numeric_bins((values.values.astype(np.int64) - start).astype(float), bins)
+        x           = pd.to_datetime(start + np.array(x, dtype=np.int64)).strftime('%Y-%m-%d %H:%M:%S').tolist()
+        width       = [w / 1e6 for w in width] if len(x) > 1 else None
+        return {'kind': 'datetime', 'title': series.name, 'x': x, 'y': y, 'width': width}
+
+    if values.dtype != bool and pd.api.types.is_numeric_dtype(values):
+        x, y, width = numeric_bins(values.values.astype(float), bins)
+        return {'kind': 'numeric', 'title': series.name, 'x': x, 'y': y, 'width': width}
+
+    values  = values.astype(str)
+    lengths = values.str.len()
+
+    if values.size > 0 and lengths.mean() > LONG_TEXT:
+        x, y, width = numeric_bins(lengths.values.astype(float), bins)
+        return {'kind': 'length', 'title': '{} (length)'.format(series.name), 'x': x, 'y': y, 'width': width}
+
+    counts = values.value_counts().head(top)
+    return {'kind': 'categorical', 'title': series.name, 'x': counts.index.tolist(), 'y': counts.values.tolist(), 'width': None}
+
+
+
+def partial_bins(att, bins=BINS, top=TOP_VALUES):
+    # Approximate bins drawn from the quantile sketch / most frequent values
+    length = att['type'] == 'string' and att['count'] and att['sum'] / att['count'] > LONG_TEXT
+
+    if att['type'] in ('int', 'float') or length:
+        values, weights = np.array(att['sketch'] or np.empty((0, 2))).T
+        x, y, width     = numeric_bins(values, bins, weights)
+        title           = '{} (length)'.format(att['name']) if length else att['name']
+        return {'kind': 'length' if length else 'numeric', 'title': title, 'x': x, 'y': y, 'width': width}
+
+    modes = att['modes'][:top]
+    return {'kind': 'categorical', 'title': att['name'], 'x': [str(v) for v, _ in modes], 'y': [c for _, c in modes], 'width': None}
+
+
+
+# Bins of each (release, file, column), computed the first time a page needs them
+HISTOGRAMS = cache.Store('histograms')
+
+
+def _histogram(release, name, att):
+    if streamed(release, name):
+        atts = partial(release, name)['attributes']
+        return partial_bins([a for a in atts if a['name'] == att][0])
+    return histogram_bins(releases.dataframe(release, name, [att])[att])
+
+
+
+def histogram(release, name, att):
+    return HISTOGRAMS.cached((release, name, att), lambda: _histogram(release, name, att), release)
+
+
+
+def columns(release, name):
+    if streamed(release, name):
+        return [att['name'] for att in partial(release, name)['attributes']]
+    return releases.header(release, name)
@@ -0,0 +1,278 @@
+import collections
+import datetime
+import hashlib
+import json
+import os
+import re
+
+
+################################################################################
+#
+# CONSTANTS
+#
+################################################################################
+
+RELEASES_FOLDER = './data/releases'
+VIEWS_FOLDER    = './data/views'
+
+
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+
+# Release folders are named after the day they cover, e.g. jan-01-02_2018
+FOLDER_NAME = re.compile(r'^([a-z]{3})-(\d{2})-(\d{2})_(\d{4})$')
+
+
+# Release files are named <FILE>_<folder>.csv, e.g. VOTES_jan-01-02_2018.csv
+FILE_NAME = re.compile(r'^([A-Za-z]+)_(.+)\.csv$')
+
+
+# A view is named after the release folder it describes (<folder>.json, as the
+# view builder writes them); otherwise the first descriptor's file path names
+# it, read VIEW_BLOCK bytes at a time from the start of the view
+VIEW_NAME  = re.compile(rb'"name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+VIEW_BLOCK = 4096
+
+
+
+################################################################################
+#
+# Helper Functions
+#
+################################################################################
+
+
+def ordinal(n):
+    if 10 <= n % 100 <= 20:
+        return '{}th'.format(n)
+    return '{}{}'.format(n, {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th'))
+
+
+
+def date_range(folder):
+    m = FOLDER_NAME.match(folder)
+    if m is None or m.group(1) not in MONTHS:
+        return None, None
+
+    start = datetime.date(int(m.group(4)), MONTHS.index(m.group(1)) + 1, int(m.group(2)))
+    end   = start
+    for _ in range(31):
+        if end.day == int(m.group(3)):
+            return start, end
+        end += datetime.timedelta(days=1)
+
+    return start, None
+
+
+
+def label(folder, start):
+    if start is None:
+        return folder
+    return '{} {} {}'.format(start.strftime('%B'), ordinal(start.day), start.year)
+
+
+
+def release_files(folder):
+    files = collections.OrderedDict()
+
+    for entry in sorted(os.scandir(os.path.join(RELEASES_FOLDER, folder)), key=lambda e: e.name):
+        m = FILE_NAME.match(entry.name)
+        if m is None or not entry.is_file():
+            continue
+
+        stat = entry.stat()
+        files[m.group(1).capitalize()] = {
+            'path':  os.path.join(RELEASES_FOLDER, folder, entry.name),
+            'size':  stat.st_size,
+            'mtime': stat.st_mtime_ns,
+        }
+
+    return files
+
+
+
+# Release folder each view describes, by view path: {path: (mtime, folder)}
+VIEW_FOLDERS = {}
+
+
+def first_name(path):
+    # The first "name" of the document, without decoding the rest of it
+    tail = b''
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(VIEW_BLOCK)
+            m     = VIEW_NAME.search(tail + block)
+            if m is not None:
+                return json.loads(b'"' + m.group(1) + b'"')
+            if not block:
+                return None
+            tail = (tail + block)[-VIEW_BLOCK:]
+
+
+
+def view_folder(path, mtime):
+    # Read from the first descriptor's file path, e.g. ../releases/jan-01-02_2018/POSTS_jan-01-02_2018.csv;
+    # rollups name a span of folders (jan-01-02_2018..jan-03-04_2018) and describe no release
+    if VIEW_FOLDERS.get(path, (None,))[0] != mtime:
+        try:
+            name = first_name(path)
+        except (OSError, ValueError):
+            name = None
+
+        VIEW_FOLDERS[path] = (mtime, name and os.path.basename(os.path.dirname(name)))
+
+    return VIEW_FOLDERS[path][1]
+
+
+
+def release_views(folders):
+    # {folder: view path}: <folder>.json first, then views read by content
+    views = {}
+    if not os.path.isdir(VIEWS_FOLDER):
+        return views
+
+    entries = [e for e in sorted(os.scandir(VIEWS_FOLDER), key=lambda e: e.name) if e.name.endswith('.json') and e.is_file()]
+    for entry in entries:
+        if entry.name[:-len('.json')] in folders:
+            views[entry.name[:-len('.json')]] = entry.path
+
+    for entry in entries:
+        if entry.name[:-len('.json')] not in folders:
+            folder = view_folder(entry.path, entry.stat().st_mtime_ns)
+            if folder in folders:
+                views.setdefault(folder, entry.path)
+
+    return views
+
+
+
+def version(files, view):
+    # Changes whenever a file of the release (or its view) is replaced
+    key  = [(name, f['size'], f['mtime']) for name, f in files.items()]
+    key += [os.stat(view).st_mtime_ns if view else None]
+    return hashlib.sha1(repr(key).encode('utf8')).hexdigest()[:16]
+
+
+
+def digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+
+def contents(release):
+    # What a release holds whatever its file times: {'files': {name: [size, digest]}, 'view': digest}
+    meta = RELEASES[release]
+    return {
+        'files': {name: [f['size'], digest(f['path'])] for name, f in meta['files'].items()},
+        'view':  meta['view'] and digest(meta['view']),
+    }
+
+
+
+################################################################################
+#
+# RELEASE REGISTRY
+#
+# Releases are discovered from the folders under RELEASES_FOLDER, ordered by
+# date and named after their folder, so a release keeps its name whatever is
+# added around it. Only directory entries are read: release files are not
+# opened until a page asks for them, and views are matched by name or by the
+# first descriptor's path (see view_folder) when they change.
+#
+################################################################################
+
+
+def scan():
+    # No releases folder (e.g. the view builder run from elsewhere): no releases
+    if not os.path.isdir(RELEASES_FOLDER):
+        return collections.OrderedDict()
+
+    folders = [
+        entry.name for entry in os.scandir(RELEASES_FOLDER)
+        if entry.is_dir() and not entry.name.startswith('.')
+    ]
+
+    # Dated folders first, oldest to newest, then any other folder by name
+    folders.sort(key=lambda f: (date_range(f)[0] is None, date_range(f)[0] or datetime.date.min, f))
+
+    views    = release_views(folders)
+    releases = collections.OrderedDict()
+    for folder in folders:
+        start, end = date_range(folder)
+        files      = release_files(folder)
+        view       = views.get(folder)
+
+        releases[folder] = {
+            'release': folder,
+            'folder':  folder,
+            'label':   label(folder, start),
+            'start':   start,
+            'end':     end,
+            'files':   files,
+            'size':    sum(f['size'] for f in files.values()),
+            'view':    view,
+            'version': version(files, view),
+        }
+
+    return releases
+
+
+
+RELEASES = scan()
+
+
+
+def changes(old, new):
+    # (release, file) pairs added, replaced or removed between two scans; the
+    # file is None when only the release's view changed
+    pairs = []
+    for release in sorted(set(old) | set(new)):
+        before = old.get(release)
+        after  = new.get(release)
+        if before is not None and after is not None and before['version'] == after['version']:
+            continue
+
+        files = sorted(set(before['files'] if before else []) | set(after['files'] if after else []))
+        named = [
+            (release, name) for name in files
+            if (before and before['files'].get(name)) != (after and after['files'].get(name))
+        ]
+        pairs += named or [(release, None)]
+
+    return pairs
+
+
+
+def refresh():
+    # Scans again and swaps the registry in one assignment
+    global RELEASES
+    old      = RELEASES
+    RELEASES = scan()
+    return changes(old, RELEASES)
+
+
+
+def metadata(release):
+    return RELEASES[release]
+
+
+
+def file_path(release, name):
+    return RELEASES[release]['files'][name]['path']
+
+
+
+def options(releases=None):
+    return [
+        {'label': r['label'], 'value': r['release']} for r in RELEASES.values()
+        if releases is None or r['release'] in releases
+    ]
+
+
+
+def views():
+    return [r['release'] for r in RELEASES.values() if r['view'] is not None]
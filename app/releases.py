@@ -0,0 +1,576 @@
+import numpy as np
+import pandas as pd
+
+# Private pandas API, written against pandas 0.24 (see requirements.txt); other
+# versions fall back to frames that copy their columns
+try:
+    from pandas.core.internals import BlockManager, make_block
+except ImportError:
+    BlockManager = make_block = None
+
+import collections
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+
+
+import registry
+
+
+################################################################################
+#
+# CONSTANTS
+#
+################################################################################
+
+RELEASES_FILES = [
+    'Votes',
+    'Badges',
+    'Comments',
+    'Posts',
+    'Users'
+]
+
+
+# Typed columnar copies of the release CSVs (see CSV CACHE)
+CACHE_FOLDER = './data/cache'
+
+
+# Text columns with at most this share of distinct values become categoricals
+# (badge Name, Location, ...)
+CATEGORY_RATIO = 0.5
+
+
+# Floats keep 32 bits when their values are whole and below this (IDs padded
+# with NaN), so float32 represents them exactly
+FLOAT32_INTEGERS = 2**24
+
+
+# pd.read_csv options overriding the defaults for a (release folder, file) pair
+READ_OPTIONS = {}
+
+
+# Posts are read POSTS_BLOCK bytes at a time (see POSTS INGESTION)
+POSTS_BLOCK = 16 * 2**20
+
+
+
+################################################################################
+#
+# COMPACTION
+#
+# Release frames are stored with the smallest dtypes that hold their values:
+# downcast integers, float32 for NaN-padded IDs, datetime64 for the *Date
+# columns and categoricals for repeated strings. Every stored value is kept: a
+# column that would lose one keeps its parsed dtype. Arithmetic is not: sums of
+# float32 or downcast integer columns round or overflow in their own dtype, so
+# code aggregating release columns widens them first (see analytics.widened and
+# partials.attributeValues).
+#
+################################################################################
+
+
+def compact_column(column):
+    if column.dtype == bool:
+        return column
+
+    if np.issubdtype(column.dtype, np.integer):
+        return pd.to_numeric(column, downcast='integer')
+
+    if np.issubdtype(column.dtype, np.floating):
+        values = column.values[np.isfinite(column.values)]
+        if np.all(np.mod(values, 1) == 0) and (values.size == 0 or np.abs(values).max() < FLOAT32_INTEGERS):
+            return column.astype(np.float32)
+        return column
+
+    if column.dtype != object:
+        return column
+
+    if column.name.endswith('Date'):
+        dates = pd.to_datetime(column, errors='coerce')
+        if dates.notnull().sum() == column.notnull().sum():
+            return dates
+
+    values = column.dropna()
+    if values.map(type).eq(str).all() and values.nunique() <= CATEGORY_RATIO * max(values.size, 1):
+        return column.astype('category')
+
+    return column
+
+
+
+def compact(df):
+    return pd.DataFrame({c: compact_column(df[c]) for c in df.columns}, columns=df.columns)
+
+
+
+################################################################################
+#
+# POSTS INGESTION
+#
+# Post bodies are multi-line quoted HTML, and some dumps hold records cut short
+# (an unbalanced quote swallows the rows after it). Posts are therefore cut
+# into records first: a record starts on a new line with its quoted Id and
+# PostTypeId, and is kept only when it is exactly one well-formed CSV row.
+# Records are checked together with numpy (quotes balanced and placed at field
+# bounds, one field per header column); only those failing the check are
+# matched against the CSV grammar, one by one. Kept records are parsed by the
+# C engine with standard quoting, a run of consecutive records at a time, then
+# rows without a numeric Id / PostTypeId or a CreationDate are dropped too.
+# Dropped rows are counted in REJECTED.
+#
+################################################################################
+
+
+# A record starts after a newline with its quoted Id and PostTypeId
+POSTS_RECORD = re.compile(rb'"\d+","\d+",')
+
+
+# Columns every kept post must have
+POSTS_KEYS = ['Id', 'PostTypeId', 'CreationDate']
+
+
+# Bytes that delimit CSV fields and rows
+CSV_SPECIAL = np.zeros(256, dtype=bool)
+CSV_SPECIAL[[ord('"'), ord(','), ord('\n'), ord('\r')]] = True
+
+
+# Quoted ("" escapes a quote) or bare CSV field
+CSV_FIELD = r'(?:"(?:[^"]|"")*"|[^",\r\n]*)'
+
+
+# Rows rejected while parsing each (release, file)
+REJECTED = {}
+
+
+def record_starts(data):
+    # Offsets of the records of `data`, the first one at 0
+    b     = np.frombuffer(data, dtype=np.uint8)
+    after = np.flatnonzero((b[:-2] == ord('\n')) & (b[1:-1] == ord('"')) & (b[2:] - ord('0') <= 9)) + 1
+    return np.array([0] + [i for i in after if POSTS_RECORD.match(data, i)], dtype=np.int64)
+
+
+
+def record_ends(data, starts):
+    # Offset past the content of each record, its \r\n / \n left out
+    b    = np.frombuffer(data, dtype=np.uint8)
+    ends = np.append(starts[1:], len(data))
+    for char in (ord('\n'), ord('\r')):
+        ends -= (ends > starts) & (b[ends - 1] == char)
+    return ends
+
+
+
+def well_formed(data, starts, ends, fields):
+    # One CSV row of `fields` fields per record, checked for every record at once
+    # from the only bytes that matter: quotes, commas and line breaks
+    b      = np.frombuffer(data, dtype=np.uint8)
+    pos    = np.flatnonzero(CSV_SPECIAL[b])
+    char   = b[pos]
+    quote  = char == ord('"')
+    record = np.searchsorted(starts, pos, side='right') - 1
+
+    # Whether each byte is within quotes, counting from the start of its record
+    quotes = np.concatenate([[0], np.cumsum(quote)])
+    inside = (quotes[:-1] - quotes[np.searchsorted(pos, starts)][record]) % 2 == 1
+
+    prev   = b[np.maximum(pos - 1, 0)]
+    succ   = b[np.minimum(pos + 1, len(b) - 1)]
+
+    # Quotes open at the start of a field and close at its end ("" escapes one);
+    # line breaks only within quotes
+    bad    = quote & ~inside & (pos != starts[record]) & (prev != ord(',')) & (prev != ord('"'))
+    bad   |= quote & inside & (pos + 1 != ends[record]) & (succ != ord(',')) & (succ != ord('"'))
+    bad   |= ~inside & ~quote & (char != ord(','))
+    comma  = ~inside & (char == ord(','))
+
+    # Line ends past a record's content are left out
+    within = pos < ends[record]
+
+    def count(values):
+        return np.bincount(record[values & within], minlength=len(starts))
+
+    return (ends > starts) & (count(quote) % 2 == 0) & (count(bad) == 0) & (count(comma) == fields - 1)
+
+
+
+def posts_blocks(source, block=POSTS_BLOCK):
+    # (header, data, record offsets) of each block of the file; the last record
+    # of a block is carried over to the next one
+    with open(source, 'rb') as f:
+        header = f.readline().rstrip(b'\r\n')
+        tail   = b''
+
+        for data in iter(lambda: f.read(block), b''):
+            data   = tail + data
+            starts = record_starts(data)
+            tail   = data[starts[-1]:]
+            if len(starts) > 1:
+                yield header, data[:starts[-1]], starts[:-1]
+
+        if tail.strip():
+            yield header, tail.rstrip(b'\r\n'), np.zeros(1, dtype=np.int64)
+
+
+
+def posts_frame(header, data, starts, options={}):
+    ends = record_ends(data, starts)
+    ok   = well_formed(data, starts, ends, header.count(b',') + 1)
+
+    # Records failing the vectorised check are matched against the grammar
+    if not ok.all():
+        row = re.compile('{0}(?:,{0}){{{1}}}'.format(CSV_FIELD, header.count(b',')), re.S)
+        for i in np.flatnonzero(~ok):
+            ok[i] = row.fullmatch(data[starts[i]:ends[i]].decode('utf8')) is not None
+
+    # Runs of consecutive kept records are passed on whole
+    bounds = np.flatnonzero(np.diff(np.concatenate([[False], ok, [False]]).astype(np.int8)))
+    runs   = [data[starts[a]:ends[b - 1]] for a, b in zip(bounds[::2], bounds[1::2])]
+
+    # Projections still read the columns rows are validated on
+    if 'usecols' in options:
+        options = dict(options, usecols=list(options['usecols']) + [c for c in POSTS_KEYS if c not in options['usecols']])
+    df      = pd.read_csv(io.BytesIO(b'\n'.join([header] + runs)), engine='c', **options)
+
+    keep    = pd.to_numeric(df['Id'], errors='coerce').notnull()
+    keep   &= pd.to_numeric(df['PostTypeId'], errors='coerce').notnull()
+    keep   &= pd.to_datetime(df['CreationDate'], errors='coerce').notnull()
+
+    return df[keep.values].reset_index(drop=True), len(starts) - int(keep.sum())
+
+
+
+def read_posts(source, options={}):
+    frames, rejected, df = [], 0, None
+    for header, data, starts in posts_blocks(source):
+        df, r     = posts_frame(header, data, starts, options)
+        frames   += [df] if len(df) else []
+        rejected += r
+
+    if df is None:
+        return pd.read_csv(source, nrows=0, **options), 0
+    if not frames:
+        # Every record rejected: the columns come from the parsed header
+        return df, rejected
+    return pd.concat(frames, ignore_index=True), rejected
+
+
+
+def read_posts_chunks(source, chunksize, options={}):
+    for header, data, starts in posts_blocks(source):
+        for i in range(0, len(starts), chunksize):
+            end = starts[i + chunksize] if i + chunksize < len(starts) else len(data)
+            df  = posts_frame(header, data[starts[i]:end], starts[i:i + chunksize] - starts[i], options)[0]
+            if len(df):
+                yield df
+
+
+
+# Dedicated parsers by file name: whole file -> (frame, rejected rows), and
+# chunks of at most `chunksize` rows
+PARSERS = {
+    'Posts': (read_posts, read_posts_chunks),
+}
+
+
+def parse(source, name, options={}):
+    if name in PARSERS:
+        return PARSERS[name][0](source, options)
+    return pd.read_csv(source, **options), 0
+
+
+
+def parse_chunks(source, name, chunksize, options={}):
+    if name in PARSERS:
+        return PARSERS[name][1](source, chunksize, options)
+    return pd.read_csv(source, chunksize=chunksize, **options)
+
+
+
+################################################################################
+#
+# CSV CACHE
+#
+# Each release file is cached in CACHE_FOLDER as a folder of one .npy file per
+# column, filled as pages ask for columns: missing columns are parsed (usecols)
+# and compacted once, then added to the folder. Numbers, dates and categorical
+# codes are loaded back memory-mapped read-only, so processes reading the same
+# release share its pages through the OS; free text is pickled. Each column has
+# its own metadata file, so workers adding columns at once keep each other's.
+# Cache entries are keyed by source path, size, mtime and read options, so an
+# edited CSV is parsed again and its stale entry replaced.
+#
+################################################################################
+
+
+def path(release, name):
+    return registry.file_path(release, name)
+
+
+
+def csv_options(folder, name):
+    return READ_OPTIONS.get((folder, name), {})
+
+
+
+def read_options(release, name):
+    return csv_options(registry.metadata(release)['folder'], name)
+
+
+
+def cache_key(source, options={}):
+    stat   = os.stat(source)
+    name   = registry.FILE_NAME.match(os.path.basename(source)).group(1).capitalize()
+    key    = '{}|{}|{}|{}|{}'.format(
+        os.path.abspath(source),
+        stat.st_size,
+        stat.st_mtime_ns,
+        sorted(options.items()),
+        PARSERS[name][0].__name__ if name in PARSERS else 'read_csv'
+    )
+    digest = hashlib.sha1(key.encode('utf8')).hexdigest()[:16]
+    prefix = os.path.splitext(os.path.basename(source))[0]
+
+    return '{}.{}'.format(prefix, digest)
+
+
+
+def _cache_path(release, name):
+    return '{}/{}'.format(CACHE_FOLDER, cache_key(path(release, name), read_options(release, name)))
+
+
+
+def header(release, name):
+    key = (release, name)
+    if key not in _HEADERS:
+        _HEADERS[key] = list(pd.read_csv(path(release, name), nrows=0, **read_options(release, name)).columns)
+    return _HEADERS[key]
+
+
+
+def _parse_columns(release, name, columns):
+    options = dict(read_options(release, name), usecols=list(columns))
+    df, rejected = parse(path(release, name), name, options)
+    return compact(df), rejected
+
+
+
+def _save_column(column, folder, file):
+    entry = {'file': file}
+
+    if pd.api.types.is_categorical_dtype(column):
+        entry['kind']       = 'category'
+        entry['categories'] = column.cat.categories.tolist()
+        values              = column.cat.codes.values
+    elif column.dtype == object:
+        entry['kind'] = 'object'
+        values        = column.values
+    else:
+        entry['kind'] = 'array'
+        values        = column.values
+
+    # Written aside then renamed: readers never see a partial file
+    tmp = os.path.join(folder, '{}.{}.tmp'.format(file, os.getpid()))
+    with open(tmp, 'wb') as f:
+        np.save(f, values, allow_pickle=entry['kind'] == 'object')
+    os.replace(tmp, os.path.join(folder, file))
+
+    return entry
+
+
+
+def _write_json(path, value):
+    # Written aside then renamed: readers never see a partial file
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(value, f)
+    os.replace(tmp, path)
+
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+
+def _meta(folder):
+    # rows.json holds the file's row counts, <i>.json the entry of its i-th
+    # column: workers adding columns at once never overwrite each other's
+    meta = _read_json(os.path.join(folder, 'rows.json'))
+    if meta is None:
+        return None
+
+    meta['columns'] = {}
+    for f in os.listdir(folder):
+        if f.endswith('.json') and f[:-len('.json')].isdigit():
+            entry = _read_json(os.path.join(folder, f))
+            if entry is not None:
+                meta['columns'][entry['name']] = entry
+    return meta
+
+
+
+def _write_cache(df, cached, rejected, header):
+    try:
+        if not os.path.isdir(cached):
+            # Entries of older versions of the file are dropped (not this one,
+            # which a concurrent parse of the same file may have created meanwhile)
+            prefix = os.path.basename(cached).split('.')[0] + '.'
+            os.makedirs(CACHE_FOLDER, exist_ok=True)
+            for f in os.listdir(CACHE_FOLDER):
+                if f.startswith(prefix) and f != os.path.basename(cached):
+                    stale = os.path.join(CACHE_FOLDER, f)
+                    shutil.rmtree(stale, ignore_errors=True) if os.path.isdir(stale) else os.remove(stale)
+            os.makedirs(cached, exist_ok=True)
+
+        for c in df.columns:
+            i     = header.index(c)
+            entry = _save_column(df[c], cached, '{}.npy'.format(i))
+            _write_json(os.path.join(cached, '{}.json'.format(i)), dict(entry, name=c))
+
+        _write_json(os.path.join(cached, 'rows.json'), {'rows': len(df), 'rejected': rejected})
+    except OSError:
+        pass
+
+
+
+def _load_column(cached, entry):
+    file = os.path.join(cached, entry['file'])
+    if entry['kind'] == 'object':
+        return np.load(file, allow_pickle=True)
+
+    values = np.load(file, mmap_mode='r')
+    if entry['kind'] == 'category':
+        return pd.Categorical.from_codes(values, entry['categories'])
+    return values
+
+
+
+def read(release, name, columns):
+    # {column: values} of the requested columns, parsing those not cached yet
+    cached = _cache_path(release, name)
+    meta   = _meta(cached)
+    absent = [c for c in columns if meta is None or c not in meta['columns']]
+
+    if absent:
+        df, rejected = _parse_columns(release, name, absent)
+        _write_cache(df, cached, rejected, header(release, name))
+        meta = _meta(cached)
+
+        if meta is None or any(c not in meta['columns'] for c in df.columns):
+            # Cache folder not writable: keep the parsed columns in memory
+            _ROWS[(release, name)]    = len(df)
+            REJECTED[(release, name)] = rejected
+            return {c: df[c].values for c in df.columns}
+
+    _ROWS[(release, name)]    = meta['rows']
+    REJECTED[(release, name)] = meta['rejected']
+    return {c: _load_column(cached, meta['columns'][c]) for c in columns}
+
+
+
+def convert(release):
+    for name in registry.metadata(release)['files']:
+        dataframe(release, name)
+
+
+
+
+################################################################################
+#
+# RELEASE STORE
+#
+# One copy of each column of a release file per process, loaded the first
+# time a callback asks for it. Pipelines ask for the columns they use, so Body,
+# AboutMe or Text are only read by the pages showing them.
+#
+################################################################################
+
+_COLUMNS = {}
+_HEADERS = {}
+_ROWS    = {}
+_LOCKS   = {}
+_LOCK    = threading.Lock()
+
+
+def _lock(key):
+    with _LOCK:
+        return _LOCKS.setdefault(key, threading.Lock())
+
+
+
+def _frame(values, columns, rows):
+    if BlockManager is None:
+        return pd.DataFrame(collections.OrderedDict((c, values[c]) for c in columns), index=pd.RangeIndex(rows))
+
+    # One block per column: pandas would copy mapped arrays to consolidate them.
+    # Block placement and the BlockManager(blocks, axes) signature are those of
+    # pandas 0.24; recheck this when upgrading pandas
+    blocks = []
+    for i, c in enumerate(columns):
+        if isinstance(values[c], pd.Categorical):
+            blocks.append(make_block(values[c], placement=[i], ndim=2))
+        else:
+            blocks.append(make_block(values[c].reshape(1, -1), placement=[i], ndim=2))
+
+    return pd.DataFrame(BlockManager(blocks, [pd.Index(columns), pd.RangeIndex(rows)]))
+
+
+
+def dataframe(release, name, columns=None):
+    key     = (release, name)
+    columns = header(release, name) if columns is None else list(columns)
+    missing = [c for c in columns if (release, name, c) not in _COLUMNS]
+
+    if missing:
+        # Concurrent callbacks asking for the same file wait for a single parse
+        with _lock(key):
+            missing = [c for c in columns if (release, name, c) not in _COLUMNS]
+            if missing:
+                for c, values in read(release, name, missing).items():
+                    _COLUMNS[(release, name, c)] = values
+
+    values = {c: _COLUMNS[(release, name, c)] for c in columns}
+    return _frame(values, columns, _ROWS[key])
+
+
+
+def rows(release, name):
+    # Row count without loading more than one column
+    if (release, name) not in _ROWS:
+        dataframe(release, name, header(release, name)[:1])
+    return _ROWS[(release, name)]
+
+
+
+def rejected(release, name):
+    # Rows of the file dropped as malformed
+    rows(release, name)
+    return REJECTED[(release, name)]
+
+
+
+def evict(release, name):
+    # Forget a replaced file; its columns are loaded again when next asked for
+    for key in [k for k in list(_COLUMNS) if k[:2] == (release, name)]:
+        del _COLUMNS[key]
+
+    for cache in (_HEADERS, _ROWS, REJECTED):
+        cache.pop((release, name), None)
+
+
+
+# Fill the CSV cache ahead of time, e.g. right after a release is copied in:
+#   python releases.py [jan-01-02_2018 ...]
+if __name__ == '__main__':
+    for release in sys.argv[1:] or registry.RELEASES:
+        convert(release)
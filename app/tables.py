@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+
+import filters
+
+
+################################################################################
+#
+# CONSTANTS
+#
+################################################################################
+
+# Rows per DataTable page
+PAGE_SIZE = 10
+
+
+PAGINATION_SETTINGS = {
+    'displayed_pages': 1,
+    'current_page':    0,
+    'page_size':       PAGE_SIZE,
+}
+
+
+
+################################################################################
+#
+# FILTERING
+#
+################################################################################
+
+
+def filter_mask(df, filtering_settings):
+    # Expressions the engine cannot parse filter nothing, as in the browser
+    try:
+        return filters.mask(df, filtering_settings)
+    except ValueError:
+        return np.ones(len(df), dtype=bool)
+
+
+
+################################################################################
+#
+# PAGING
+#
+# Pages are served from frames the pipelines already cache. Sorted row orders
+# are kept per (table key, sort columns) so paging through a sorted table only
+# slices an index array.
+#
+################################################################################
+
+
+ORDERS = {}
+
+
+def sort_order(key, df, sorting_settings):
+    by  = tuple((s['column_id'], s['direction']) for s in sorting_settings or [] if s['column_id'] in df.columns)
+    key = (key, by)
+
+    if key not in ORDERS:
+        if by:
+            ORDERS[key] = df.reset_index(drop=True).sort_values(
+                by=[c for c, _ in by],
+                ascending=[d == 'asc' for _, d in by],
+                kind='mergesort',
+                na_position='last',
+            ).index.values
+        else:
+            ORDERS[key] = np.arange(len(df))
+
+    return ORDERS[key]
+
+
+
+def page(key, df, pagination_settings=None, sorting_settings=None, filtering_settings=None):
+    settings = pagination_settings or PAGINATION_SETTINGS
+    size     = settings.get('page_size', PAGE_SIZE)
+    start    = settings.get('current_page', 0) * size
+
+    order = sort_order(key, df, sorting_settings)
+    if filtering_settings:
+        order = order[filter_mask(df, filtering_settings)[order]]
+
+    return df.iloc[order[start:start + size]].to_dict('rows')
+
+
+
+def evict(release):
+    # Table keys start with the operation and the release, e.g. ('stats', 'jan-01-02_2018', 'Votes')
+    for key in [k for k in list(ORDERS) if release in k[0]]:
+        del ORDERS[key]
@@ -0,0 +1,126 @@
+import collections
+import socket
+import threading
+import time
+import traceback
+
+
+import registry
+
+
+################################################################################
+#
+# CONSTANTS
+#
+################################################################################
+
+# Seconds between checks that the server accepts connections
+POLL = 0.5
+
+
+# Releases remembered as recently requested
+RECENT = 8
+
+
+
+################################################################################
+#
+# WARM-UP
+#
+# Once the server is listening, a background thread computes the artifacts of
+# one release after the other: the most recent release first, then the ones
+# pages asked for lately (latest first), then the rest, newest first. The order
+# is decided again before each release, so a request reorders what is left.
+# A callback for a release not warmed up yet computes (or waits for) only the
+# artifacts it needs, under the Store's per-key locks. Releases the watcher
+# finds added or replaced are queued again.
+#
+################################################################################
+
+
+REQUESTED = collections.OrderedDict()
+READY     = set()
+LOCK      = threading.Lock()
+WAKE      = threading.Event()
+
+
+def request(release):
+    with LOCK:
+        REQUESTED.pop(release, None)
+        REQUESTED[release] = True
+        while len(REQUESTED) > RECENT:
+            REQUESTED.popitem(last=False)
+
+
+
+def next_release():
+    with LOCK:
+        pending = [r for r in registry.RELEASES if r not in READY]
+        if not pending:
+            return None
+
+        newest = list(registry.RELEASES)[-1]
+        if newest in pending:
+            return newest
+
+        for release in reversed(REQUESTED):
+            if release in pending:
+                return release
+
+        return pending[-1]
+
+
+
+def invalidate(releases):
+    # Releases added or replaced since they were warmed up
+    with LOCK:
+        READY.difference_update(releases)
+    WAKE.set()
+
+
+
+def status():
+    with LOCK:
+        return {
+            'ready':   [r for r in registry.RELEASES if r in READY],
+            'pending': [r for r in registry.RELEASES if r not in READY],
+        }
+
+
+
+def listening(host, port):
+    try:
+        socket.create_connection((host, port), timeout=POLL).close()
+        return True
+    except OSError:
+        return False
+
+
+
+def run(warm, host, port):
+    while not listening(host, port):
+        time.sleep(POLL)
+
+    while True:
+        WAKE.clear()
+        release = next_release()
+        if release is None:
+            WAKE.wait()
+            continue
+
+        try:
+            warm(release)
+        except Exception:
+            # Pages of a release that fails here report the error when asked for
+            traceback.print_exc()
+
+        with LOCK:
+            READY.add(release)
+
+
+
+def start(warm, host='127.0.0.1', port=8050):
+    # `warm(release)` computes the artifacts of a release (see bundle.build)
+    thread = threading.Thread(target=run, args=(warm, host, port), name='warmup', daemon=True)
+    thread.start()
+    return thread
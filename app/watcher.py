@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+import traceback
+
+
+import cache
+import registry
+import releases
+import tables
+import warmup
+
+
+################################################################################
+#
+# CONSTANTS
+#
+################################################################################
+
+# Seconds between two scans of the releases and views folders, e.g.
+#   CURARE_WATCH_POLL=60 python index.py
+POLL = float(os.environ.get('CURARE_WATCH_POLL', 10))
+
+
+
+################################################################################
+#
+# RELEASES WATCHER
+#
+# The releases and views folders are scanned again every POLL seconds (only
+# directory entries and their stats are read). When a release folder, file or
+# view is added, replaced or removed, the new registry is swapped in and what
+# was loaded for the changed files alone is dropped: columns of the other files
+# stay in memory and their on-disk column cache stays valid. Artifacts derived
+# from a changed release are keyed by its old version and dropped as well; the
+# warm-up computes them again.
+#
+################################################################################
+
+
+def evict(changes, old):
+    for release, name in changes:
+        if name is not None:
+            releases.evict(release, name)
+
+    changed = sorted(set(release for release, _ in changes))
+    for release in changed:
+        tables.evict(release)
+        if release in old:
+            for store in cache.STORES.values():
+                store.evict(release, old[release]['version'])
+
+    warmup.invalidate(changed)
+
+
+
+def check():
+    old     = registry.RELEASES
+    changes = registry.refresh()
+    if changes:
+        evict(changes, old)
+    return changes
+
+
+
+def run(poll):
+    while True:
+        time.sleep(poll)
+        try:
+            check()
+        except Exception:
+            # A folder half copied or removed meanwhile: scanned again next time
+            traceback.print_exc()
+
+
+
+def start(poll=POLL):
+    thread = threading.Thread(target=run, args=(poll,), name='watcher', daemon=True)
+    thread.start()
+    return thread
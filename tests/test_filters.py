@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import filters
+
+
+DF = pd.DataFrame({
+    'Views':        [5, 12, 7, np.nan, 30],
+    'Location':     ['Asia', 'Europe', "Côte d'Ivoire", None, 'New York'],
+    'Display Name': ['nick', 'ann', 'bob', 'ann', 'joe'],
+    'Mixed':        [True, 3, 'x', None, {'a': 1}],
+})
+
+
+def rows(expression):
+    return list(np.flatnonzero(filters.mask(DF, expression)))
+
+
+@pytest.mark.parametrize('expression, expected', [
+    # && binds tighter than ||, whatever the spelling
+    ('"Views" < 6 || "Views" > 10 && "Display Name" eq "ann"', [0, 1]),
+    ('"Views" < 6 or "Views" > 10 and "Display Name" eq "ann"', [0, 1]),
+    ('("Views" < 6 || "Views" > 10) && "Display Name" eq "ann"', [1]),
+    ('"Display Name" eq "ann" && "Views" > 10 || "Views" < 6', [0, 1]),
+    # ! applies to the next term only
+    ('!"Views" > 10 && "Display Name" ne "nick"', [2, 3]),
+    ('!("Views" > 10 && "Display Name" ne "nick")', [0, 2, 3]),
+])
+def test_precedence(expression, expected):
+    assert rows(expression) == expected
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('"Location" eq "New York"', [4]),
+    ("'Location' eq 'New York'", [4]),
+    ('`Location` eq `Asia`', [0]),
+    ("\"Location\" eq 'Côte d\\'Ivoire'", [2]),
+    ('"Location" eq str(New York)', [4]),
+    ('Location eq Asia', [0]),
+    # Quoted numbers still compare as numbers on numeric columns
+    ('"Views" eq "12"', [1]),
+    ('"Views" > num(10)', [1, 4]),
+])
+def test_quoting(expression, expected):
+    assert rows(expression) == expected
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('"Views" is nil', [3]),
+    ('"Location" is nil', [3]),
+    ('"Views" is num', [0, 1, 2, 4]),
+    ('"Views" is odd', [0, 2]),
+    ('"Views" is even', [1, 4]),
+    ('"Views" is prime', [0, 2]),
+    ('"Mixed" is bool', [0]),
+    ('"Mixed" is num', [1]),
+    ('"Mixed" is str', [2]),
+    ('"Mixed" is object', [4]),
+    ('"Location" is num', []),
+    ('"Views" is str', []),
+    ('"Views" is nil || "Views" ge 30', [3, 4]),
+])
+def test_is_checks(expression, expected):
+    assert rows(expression) == expected
+
+
+def test_nulls_never_match_text_comparisons():
+    assert rows('"Location" ne "Asia"') == [1, 2, 4]
+
+
+def test_unknown_column_matches_nothing():
+    assert rows('"Reputation" > 1') == []
+
+
+@pytest.mark.parametrize('expression', ['', '   ', None])
+def test_empty_expression_keeps_every_row(expression):
+    assert rows(expression) == list(range(len(DF)))
+
+
+@pytest.mark.parametrize('expression', [
+    '"Views" >',
+    '"Views" ~ 10',
+    '("Views" > 10',
+    '"Views" > 10)',
+    '"Views" > 10 &&',
+    '"Views" is',
+])
+def test_bad_expressions_raise_value_error(expression):
+    with pytest.raises(ValueError):
+        filters.mask(DF, expression)
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import partials
+
+
+@pytest.mark.parametrize('values', [
+    [1],
+    [1, 2],
+    [1, 2, 3],
+    [1, 2, 3, 4],
+    [4, 1, 1, 2, 2, 3],
+    [0.5, 0.5, 7, 9],
+])
+def test_sketch_median_matches_numpy(values):
+    assert partials.sketchMedian(partials.sketch(np.array(values, dtype=float))) == np.median(values)
+
+
+def test_sketch_median_matches_numpy_on_random_values():
+    rng = np.random.RandomState(0)
+    for size in (2, 10, 101, 500):
+        values = rng.randint(0, 200, size).astype(float)
+        assert partials.sketchMedian(partials.sketch(values)) == np.median(values)
+
+
+def test_sketch_median_of_nothing():
+    assert partials.sketchMedian([]) == 0
+
+
+def filePartial(df):
+    # As curare_releaseView.frameFilePartial, without a release file behind it
+    nulls = partials.null_profile(df)['Nulls'].values
+    return {
+        'name':       'POSTS',
+        'file':       'POSTS',
+        'rows':       int(df.shape[0]),
+        'attributes': [partials.attributePartial(df[c], n) for c, n in zip(df.columns, nulls)],
+    }
+
+
+def frame(size, seed=0):
+    rng = np.random.RandomState(seed)
+    df  = pd.DataFrame({
+        'Id':           np.arange(size),
+        'Score':        rng.randint(-5, 50, size),
+        'ViewCount':    np.where(rng.rand(size) < 0.3, np.nan, rng.randint(0, 1000, size)),
+        'Ratio':        rng.rand(size),
+        'Title':        np.where(rng.rand(size) < 0.2, None, rng.choice(['a', 'bb', 'ccc', ' '], size)),
+        'CreationDate': pd.date_range('2018-01-01', periods=size, freq='s').astype(str),
+    }, columns=['Id', 'Score', 'ViewCount', 'Ratio', 'Title', 'CreationDate'])
+    # A chunk of NULLs only, as ends of files often are
+    df.loc[size - 10:, 'ViewCount'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('chunksize', [1, 7, 10, 64, 1000])
+def test_merged_partials_match_single_pass(chunksize):
+    df     = frame(200)
+    whole  = filePartial(df)
+    chunks = [filePartial(df.iloc[i:i + chunksize]) for i in range(0, len(df), chunksize)]
+    merged = chunks[0]
+    for chunk in chunks[1:]:
+        # Folded in as the streaming view builder does
+        merged = partials.mergeFilePartials([merged, chunk], 'POSTS')
+
+    assert merged['rows'] == whole['rows']
+    assert [a['name'] for a in merged['attributes']] == [a['name'] for a in whole['attributes']]
+
+    for m, w in zip(merged['attributes'], whole['attributes']):
+        for key in ('type', 'count', 'nulls', 'absent', 'min', 'max'):
+            assert m[key] == w[key], (m['name'], key)
+        assert m['sum'] == pytest.approx(w['sum'])
+        # Exact while the values fit in the sketch
+        assert partials.sketchMedian(m['sketch']) == pytest.approx(partials.sketchMedian(w['sketch']))
+
+
+def test_merge_is_order_independent():
+    df     = frame(300, seed=1)
+    chunks = [filePartial(df.iloc[i:i + 50]) for i in range(0, len(df), 50)]
+    a      = partials.mergeFilePartials(chunks, 'POSTS')
+    b      = partials.mergeFilePartials(chunks[::-1], 'POSTS')
+
+    for x, y in zip(a['attributes'], b['attributes']):
+        assert (x['type'], x['count'], x['nulls'], x['min'], x['max']) == (y['type'], y['count'], y['nulls'], y['min'], y['max'])
+        assert partials.sketchMedian(x['sketch']) == pytest.approx(partials.sketchMedian(y['sketch']))
+
+
+def test_merged_median_stays_close_past_the_sketch_size():
+    values = np.random.RandomState(2).normal(100, 15, 20000)
+    chunks = [partials.sketch(values[i:i + 1000]) for i in range(0, len(values), 1000)]
+
+    assert len(partials.mergeSketches(chunks)) <= partials.SKETCH_SIZE
+    assert partials.sketchMedian(partials.mergeSketches(chunks)) == pytest.approx(np.median(values), abs=1)
@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+
+import releases
+
+
+HEADER = 'Id,PostTypeId,CreationDate,Score,Body\n'
+
+
+GOOD = [
+    '"1","1","2018-01-01 00:00:01","3","<p>one</p>"\n',
+    '"2","2","2018-01-01 00:00:02","0","<p>two\n\nlines, ""quoted""</p>"\n',
+    '"3","1","2018-01-01 00:00:03","","<p>three</p>"\r\n',
+]
+
+
+def write(tmp_path, records):
+    path = tmp_path / 'POSTS_jan-01-02_2018.csv'
+    path.write_bytes((HEADER + ''.join(records)).encode('utf8'))
+    return str(path)
+
+
+def test_well_formed_records(tmp_path):
+    df, rejected = releases.read_posts(write(tmp_path, GOOD))
+
+    assert rejected == 0
+    assert list(df['Id']) == [1, 2, 3]
+    # Quoted line breaks, commas and quotes stay within their field
+    assert df['Body'][1] == '<p>two\n\nlines, "quoted"</p>'
+    assert df['Body'][2] == '<p>three</p>'
+
+
+@pytest.mark.parametrize('record', [
+    # Quote never closed: would swallow the next records
+    '"9","1","2018-01-01 00:00:09","1","<p>cut short\n',
+    # Field missing, and one too many
+    '"9","1","2018-01-01 00:00:09","<p>nine</p>"\n',
+    '"9","1","2018-01-01 00:00:09","1","<p>nine</p>",""\n',
+    # Stray quote within a field
+    '"9","1","2018-01-01 00:00:09","1","<p>ni"ne</p>"\n',
+    # No creation date
+    '"9","1","","1","<p>nine</p>"\n',
+])
+def test_malformed_records_are_rejected(tmp_path, record):
+    for at in range(len(GOOD) + 1):
+        records      = GOOD[:at] + [record] + GOOD[at:]
+        df, rejected = releases.read_posts(write(tmp_path, records))
+
+        assert rejected == 1
+        assert list(df['Id']) == [1, 2, 3]
+
+
+def test_only_malformed_records(tmp_path):
+    df, rejected = releases.read_posts(write(tmp_path, ['"9","1","2018-01-01 00:00:09","1","<p>cut\n']))
+
+    assert rejected == 1
+    assert len(df) == 0
+    assert list(df.columns) == HEADER.strip().split(',')
+
+
+def test_projection_keeps_requested_columns(tmp_path):
+    df, rejected = releases.read_posts(write(tmp_path, GOOD), {'usecols': ['Score']})
+
+    assert rejected == 0
+    assert 'Score' in df.columns
+    assert list(df['Id']) == [1, 2, 3]
+
+
+@pytest.mark.parametrize('block', [16, 64, 4096])
+@pytest.mark.parametrize('chunksize', [1, 2, 10])
+def test_blocks_and_chunks_match_whole_file(tmp_path, monkeypatch, block, chunksize):
+    records = GOOD + ['"9","1","2018-01-01 00:00:09","1","<p>cut short\n'] + GOOD
+    source  = write(tmp_path, records)
+    whole, rejected = releases.read_posts(source)
+
+    blocks = releases.posts_blocks
+    monkeypatch.setattr(releases, 'posts_blocks', lambda source: blocks(source, block))
+
+    df, r = releases.read_posts(source)
+    assert r == rejected == 1
+    pd.testing.assert_frame_equal(df, whole)
+
+    chunks = list(releases.read_posts_chunks(source, chunksize))
+    assert all(len(df) <= chunksize for df in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), whole, check_dtype=False)